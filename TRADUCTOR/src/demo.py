@@ -1,49 +1,446 @@
 # demo.py
 import os
 import json
+import uuid
+import time
+import atexit
+import threading
+import unicodedata
 import tensorflow as tf
 import numpy as np
+from collections import Counter, defaultdict
+from contextlib import contextmanager
 from datetime import datetime
 
-class ODamDataManager:
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+# Variantes de la vocal central (ɨ / +) y del saltillo (' ’ ʼ) que se escriben de varias formas
+CHAR_VARIANTS = str.maketrans({'ɨ': '+', '’': "'", 'ʼ': "'", '‘': "'", '´': "'"})
+
+
+def normalize_word(text):
+    """Forma canónica para buscar: Unicode NFC, sin mayúsculas, '+' por 'ɨ', un solo tipo de apóstrofo y espacios simples"""
+    text = unicodedata.normalize('NFC', text).casefold().translate(CHAR_VARIANTS)
+    return ' '.join(text.split())
+
+
+# Signos que se quitan de los bordes de cada palabra de una oración (el apóstrofo es parte de la palabra)
+PUNCTUATION = '.,;:!?¿¡"()«»'
+
+
+class TokenTrie:
+    """Trie de frases por palabras normalizadas, para segmentar oraciones por la coincidencia más larga"""
+    
     def __init__(self):
-        self.vocab_odam = set()
-        self.vocab_spanish = set()
-        self.training_pairs = []
-        self.word_translations = {}
-        self.grammar_rules = {
+        self.root = {}
+    
+    def add(self, phrase, value):
+        node = self.root
+        for token in normalize_word(phrase).split():
+            node = node.setdefault(token, {})
+        node[None] = value  # La llave None marca el final de una frase
+    
+    def longest_match(self, tokens, start):
+        """Retorna (fin, valor) de la frase más larga que empieza en tokens[start], o (start, None)"""
+        node, best = self.root, (start, None)
+        for i in range(start, len(tokens)):
+            node = node.get(tokens[i])
+            if node is None:
+                break
+            if None in node:
+                best = (i + 1, node[None])
+        return best
+
+
+def trigrams(key):
+    """Trigramas de caracteres de una palabra normalizada, con marcas de inicio y fin"""
+    padded = f"^{key}$"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def edit_distance(a, b):
+    """Distancia de edición contando inserción, borrado, sustitución y transposición de letras vecinas"""
+    previous2, previous = None, list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        previous2, previous = previous, current
+    return previous[-1]
+
+
+class FuzzyIndex:
+    """Índice invertido de trigramas para sugerir palabras parecidas.
+    
+    Se actualiza con cada palabra agregada. Una búsqueda junta los candidatos que
+    comparten trigramas con la consulta, ordena los `max_candidates` con más
+    trigramas en común y solo a ellos les calcula la distancia de edición, así el
+    costo no crece con todo el vocabulario. Encuentra errores como 'tanohl' por
+    'tanolh' que una búsqueda por subcadenas no ve.
+    """
+    
+    def __init__(self, max_candidates=200):
+        self.max_candidates = max_candidates
+        self.postings = defaultdict(set)  # Trigrama -> formas normalizadas que lo contienen
+        self.entries = defaultdict(set)  # Forma normalizada -> {(palabra, idioma)}
+    
+    def add(self, word, lang):
+        key = normalize_word(word)
+        if not key:
+            return
+        if key not in self.entries:
+            for gram in trigrams(key):
+                self.postings[gram].add(key)
+        self.entries[key].add((word, lang))
+    
+    def search(self, query, k=10, max_distance=None, time_budget=0.05):
+        """Retorna hasta k (palabra, idioma) ordenados de más a menos parecido.
+        
+        Se aceptan palabras a distancia de edición de hasta `max_distance` (por defecto
+        un error cada 3 letras) y las que contienen la consulta o están contenidas en
+        ella. Si se pasan `time_budget` segundos se retorna lo mejor encontrado hasta ahí.
+        """
+        key = normalize_word(query)
+        if not key:
+            return []
+        if max_distance is None:
+            max_distance = max(1, len(key) // 3)
+        deadline = time.perf_counter() + time_budget
+        
+        scored = []
+        if len(key) < 3:
+            # Consultas de 1 o 2 letras comparten muy pocos trigramas: buscar prefijos y subcadenas directamente
+            for candidate in self.entries:
+                if key in candidate:
+                    scored.append(((0 if candidate.startswith(key) else 1, len(candidate)), 0, candidate))
+                if time.perf_counter() > deadline:
+                    break
+        else:
+            grams = trigrams(key)
+            shared = Counter()
+            for gram in grams:
+                shared.update(self.postings.get(gram, ()))
+            
+            for candidate, common in shared.most_common(self.max_candidates):
+                distance = edit_distance(key, candidate)
+                if distance <= max_distance:
+                    rank = (0, distance)
+                elif key in candidate or candidate in key:
+                    rank = (1, distance)
+                else:
+                    continue
+                similarity = 2 * common / (len(grams) + len(trigrams(candidate)))
+                scored.append((rank, -similarity, candidate))
+                if time.perf_counter() > deadline:
+                    break
+        
+        results = []
+        for _, _, candidate in sorted(scored):
+            results.extend(sorted(self.entries[candidate]))
+        return results[:k]
+
+
+def default_data():
+    """Datos vacíos con el formato de la instantánea"""
+    return {
+        'vocab_odam': [],
+        'vocab_spanish': [],
+        'training_pairs': [],
+        'odam_to_spanish': {},
+        'spanish_to_odam': {},
+        'grammar_rules': {
             'plural_rules': {},
             'verb_conjugation': {},
             'word_order': 'VSO'
         }
+    }
+
+
+def replay_journal(data, records):
+    """Aplica los cambios del diario sobre los datos de una instantánea y retorna los datos resultantes"""
+    vocab_odam = set(data.get('vocab_odam', []))
+    vocab_spanish = set(data.get('vocab_spanish', []))
+    training_pairs = list(data.get('training_pairs', []))
+    odam_to_spanish = dict(data.get('odam_to_spanish', {}))
+    spanish_to_odam = dict(data.get('spanish_to_odam', {}))
+    
+    # Los datos anteriores guardaban ambas direcciones en un solo diccionario. La dirección
+    # se deduce del lado que aparece en el vocabulario; si no se sabe, va en ambas
+    for key, value in data.get('word_translations', {}).items():
+        if key in vocab_odam and value in vocab_spanish:
+            odam_to_spanish.setdefault(key, value)
+        elif key in vocab_spanish and value in vocab_odam:
+            spanish_to_odam.setdefault(key, value)
+        elif key in vocab_odam or value in vocab_spanish:
+            odam_to_spanish.setdefault(key, value)
+            vocab_odam.add(key)
+            vocab_spanish.add(value)
+        elif key in vocab_spanish or value in vocab_odam:
+            spanish_to_odam.setdefault(key, value)
+            vocab_spanish.add(key)
+            vocab_odam.add(value)
+        else:
+            odam_to_spanish.setdefault(key, value)
+            spanish_to_odam.setdefault(key, value)
+    
+    for record in records:
+        if record['op'] == 'word':
+            vocab_odam.add(record['odam'])
+            vocab_spanish.add(record['spanish'])
+            odam_to_spanish[record['odam']] = record['spanish']
+            spanish_to_odam[record['spanish']] = record['odam']
+        elif record['op'] == 'sentence':
+            training_pairs.append({
+                'odam': record['odam'],
+                'spanish': record['spanish'],
+                'timestamp': record['timestamp']
+            })
+    
+    result = dict(data)
+    result.pop('word_translations', None)
+    result.update({
+        'vocab_odam': sorted(vocab_odam),
+        'vocab_spanish': sorted(vocab_spanish),
+        'training_pairs': training_pairs,
+        'odam_to_spanish': odam_to_spanish,
+        'spanish_to_odam': spanish_to_odam,
+        'grammar_rules': data.get('grammar_rules', default_data()['grammar_rules'])
+    })
+    if records:
+        result['journal_last_id'] = records[-1]['id']
+    return result
+
+
+class DataJournal:
+    """Diario de solo anexado junto a la instantánea JSON de los datos.
+    
+    Cada cambio se agrega como una línea JSON en lugar de reescribir todo el archivo.
+    Los fsync se agrupan (cada `sync_every` cambios o cada `sync_interval` segundos) y
+    un hilo en segundo plano compacta el diario en la instantánea cuando pasa de
+    `compact_every` líneas. Un candado de archivo protege cada escritura y cada
+    compactación, así dos sesiones pueden capturar a la vez sin pisarse.
+    """
+    
+    def __init__(self, snapshot_path, sync_every=32, sync_interval=1.0, compact_every=1000):
+        base = os.path.splitext(snapshot_path)[0]
+        self.snapshot_path = snapshot_path
+        self.journal_path = base + '.journal.jsonl'
+        self.lock_path = base + '.lock'
+        self.sync_every = sync_every
+        self.sync_interval = sync_interval
+        self.compact_every = compact_every
+        self.file = None
+        self.pending = 0  # Líneas escritas aún sin fsync
+        self.entries = 0  # Líneas del diario aún sin compactar
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread = None
+        os.makedirs(os.path.dirname(snapshot_path) or '.', exist_ok=True)
+        atexit.register(self.close)  # Sincronizar el diario también si la sesión termina sin close()
+    
+    @contextmanager
+    def locked(self):
+        """Candado exclusivo entre procesos sobre el archivo .lock"""
+        with open(self.lock_path, 'a+') as f:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+                else:
+                    f.seek(0)
+                    msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+    
+    def _read(self):
+        """Lee la instantánea y los cambios del diario que aún no contiene (llamar con el candado tomado)"""
+        snapshot = None
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path, 'r', encoding='utf-8') as f:
+                snapshot = json.load(f)
+        
+        records = []
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        records.append(json.loads(line))
+                    except json.JSONDecodeError:
+                        pass  # Última línea incompleta si una sesión se cerró a medio escribir
+        
+        # Si la sesión se cerró entre escribir la instantánea y vaciar el diario, no repetir cambios
+        last_id = (snapshot or {}).get('journal_last_id')
+        ids = [record.get('id') for record in records]
+        if last_id in ids:
+            records = records[ids.index(last_id) + 1:]
+        return snapshot, records
+    
+    def is_empty(self):
+        """True si el diario no tiene cambios sin compactar"""
+        return not os.path.exists(self.journal_path) or os.path.getsize(self.journal_path) == 0
+    
+    def load(self):
+        """Retorna (instantánea o None, cambios del diario a reaplicar)"""
+        with self.locked():
+            snapshot, records = self._read()
+        self.entries = len(records)
+        return snapshot, records
+    
+    def append(self, record):
+        """Agrega un cambio al diario"""
+        record = dict(record, id=uuid.uuid4().hex)
+        line = json.dumps(record, ensure_ascii=False) + '\n'
+        with self.lock:
+            if self.file is None:
+                self.file = open(self.journal_path, 'a', encoding='utf-8')
+            with self.locked():
+                self.file.write(line)
+                self.file.flush()
+            self.pending += 1
+            self.entries += 1
+            if self.pending >= self.sync_every:
+                self._sync()
+        
+        if self.thread is None:
+            self.stop_event.clear()
+            self.thread = threading.Thread(target=self._run, daemon=True)
+            self.thread.start()
+    
+    def _sync(self):
+        if self.pending and self.file is not None:
+            os.fsync(self.file.fileno())
+            self.pending = 0
+    
+    def _run(self):
+        while not self.stop_event.wait(self.sync_interval):
+            with self.lock:
+                self._sync()
+            if self.entries >= self.compact_every:
+                try:
+                    self.compact()
+                except Exception as e:
+                    print(f"✘ Error compactando el diario: {e}")
+    
+    def compact(self):
+        """Escribe la instantánea con todos los cambios del diario y vacía el diario.
+        
+        Se reconstruye desde el disco y no desde la memoria, para incluir también los
+        cambios que otras sesiones agregaron al diario.
+        """
+        with self.lock:
+            self._sync()
+            with self.locked():
+                snapshot, records = self._read()
+                data = replay_journal(snapshot or default_data(), records)
+                tmp_path = self.snapshot_path + '.tmp'
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(data, f, ensure_ascii=False, indent=2)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_path, self.snapshot_path)
+                open(self.journal_path, 'w').close()
+            self.entries = 0
+    
+    def close(self):
+        """Detiene el hilo de fondo y sincroniza el diario"""
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        with self.lock:
+            self._sync()
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+
+class ODamDataManager:
+    def __init__(self):
+        self.vocab_odam = set()
+        self.vocab_spanish = set()
+        self.training_pairs = []
+        self.odam_to_spanish = {}  # Traducciones O'dam -> Español, con la escritura original
+        self.spanish_to_odam = {}  # Traducciones Español -> O'dam
+        self.odam_index = {}  # Forma normalizada -> palabra O'dam
+        self.spanish_index = {}  # Forma normalizada -> palabra en español
+        self.fuzzy_index = FuzzyIndex()  # Sugerencias de palabras parecidas en ambos idiomas
+        self.odam_trie = TokenTrie()  # Frases O'dam de varias palabras, para traducir oraciones
+        self.spanish_trie = TokenTrie()
+        self.grammar_rules = default_data()['grammar_rules']
+        self.journal = None
         self.load_data()  # Cargar datos inmediatamente al inicializar
     
+    def _index_word(self, odam_word, spanish_word):
+        """Registra una traducción en ambas direcciones y en los índices normalizados"""
+        self.odam_to_spanish[odam_word] = spanish_word
+        self.spanish_to_odam[spanish_word] = odam_word
+        self.odam_index[normalize_word(odam_word)] = odam_word
+        self.spanish_index[normalize_word(spanish_word)] = spanish_word
+        self.fuzzy_index.add(odam_word, 'odam')
+        self.fuzzy_index.add(spanish_word, 'español')
+        self.odam_trie.add(odam_word, odam_word)
+        self.spanish_trie.add(spanish_word, spanish_word)
+    
+    def _build_index(self):
+        """Reconstruye los índices normalizados a partir de las traducciones y el vocabulario"""
+        self.odam_index = {normalize_word(w): w for w in self.odam_to_spanish}
+        self.spanish_index = {normalize_word(w): w for w in self.spanish_to_odam}
+        self.fuzzy_index = FuzzyIndex()
+        for word in self.vocab_odam:
+            self.fuzzy_index.add(word, 'odam')
+        for word in self.vocab_spanish:
+            self.fuzzy_index.add(word, 'español')
+        self.odam_trie = TokenTrie()
+        for word in self.odam_to_spanish:
+            self.odam_trie.add(word, word)
+        self.spanish_trie = TokenTrie()
+        for word in self.spanish_to_odam:
+            self.spanish_trie.add(word, word)
+    
+    def _add_word(self, odam_word, spanish_word):
+        """Agrega una palabra a la memoria y al diario"""
+        self.vocab_odam.add(odam_word)
+        self.vocab_spanish.add(spanish_word)
+        self._index_word(odam_word, spanish_word)
+        self.journal.append({'op': 'word', 'odam': odam_word, 'spanish': spanish_word})
+    
+    def _add_sentence_pair(self, odam_sentence, spanish_sentence):
+        """Agrega un par de oraciones a la memoria y al diario"""
+        pair = {
+            'odam': odam_sentence,
+            'spanish': spanish_sentence,
+            'timestamp': datetime.now().isoformat()
+        }
+        self.training_pairs.append(pair)
+        self.journal.append(dict(pair, op='sentence'))
+    
     def add_word(self, odam_word, spanish_word, word_type='sustantivo'):
-        """Agrega una palabra al vocabulario y guarda inmediatamente"""
+        """Agrega una palabra al vocabulario y la anota en el diario"""
         odam_clean = odam_word.strip()
         spanish_clean = spanish_word.strip()
         
-        self.vocab_odam.add(odam_clean)
-        self.vocab_spanish.add(spanish_clean)
-        self.word_translations[odam_clean] = spanish_clean
-        self.word_translations[spanish_clean] = odam_clean
-        
+        self._add_word(odam_clean, spanish_clean)
         print(f"✓ Palabra agregada: '{odam_clean}' -> '{spanish_clean}'")
-        self.save_data()  # Guardar inmediatamente después de agregar
     
     def add_sentence_pair(self, odam_sentence, spanish_sentence):
-        """Agrega un par de oraciones y guarda inmediatamente"""
+        """Agrega un par de oraciones y lo anota en el diario"""
         odam_clean = odam_sentence.strip()
         spanish_clean = spanish_sentence.strip()
         
-        self.training_pairs.append({
-            'odam': odam_clean,
-            'spanish': spanish_clean,
-            'timestamp': datetime.now().isoformat()
-        })
-        
+        self._add_sentence_pair(odam_clean, spanish_clean)
         print(f"✓ Oración agregada: '{odam_clean}' -> '{spanish_clean}'")
-        self.save_data()  # Guardar inmediatamente después de agregar
     
     def initialize_base_vocabulary(self):
         """Inicializa con el vocabulario base"""
@@ -80,10 +477,7 @@ class ODamDataManager:
         }
         
         for odam, spanish in base_words.items():
-            self.vocab_odam.add(odam)
-            self.vocab_spanish.add(spanish)
-            self.word_translations[odam] = spanish
-            self.word_translations[spanish] = odam
+            self._add_word(odam, spanish)
             
         # Agregar algunas oraciones de ejemplo
         base_sentences = [
@@ -100,75 +494,77 @@ class ODamDataManager:
         ]
         
         for sentence in base_sentences:
-            self.training_pairs.append({
-                'odam': sentence['odam'],
-                'spanish': sentence['spanish'],
-                'timestamp': datetime.now().isoformat()
-            })
+            self._add_sentence_pair(sentence['odam'], sentence['spanish'])
         
         self.save_data()
         print("✓ Vocabulario base inicializado y guardado")
     
-    def translate_word(self, word):
-        """Traduce una palabra individual"""
+    def word_language(self, word):
+        """Retorna 'odam' o 'español' según el vocabulario en que está la palabra, o None"""
+        key = normalize_word(word or '')
+        if key in self.odam_index:
+            return 'odam'
+        if key in self.spanish_index:
+            return 'español'
+        return None
+    
+    def translate_word(self, word, source_lang='auto'):
+        """Traduce una palabra individual (source_lang: 'odam', 'español' o 'auto')"""
         if not word:
             return None
-            
-        word_clean = word.strip().lower()
-        
-        # Buscar coincidencia exacta
-        if word_clean in self.word_translations:
-            return self.word_translations[word_clean]
-        
-        # Buscar coincidencia insensible a mayúsculas
-        for key, value in self.word_translations.items():
-            if key.lower() == word_clean:
-                return value
         
+        key = normalize_word(word)
+        if source_lang in ('odam', 'auto') and key in self.odam_index:
+            return self.odam_to_spanish[self.odam_index[key]]
+        if source_lang in ('español', 'auto') and key in self.spanish_index:
+            return self.spanish_to_odam[self.spanish_index[key]]
         return None
     
-    def find_similar_words(self, word):
-        """Encuentra palabras similares en el vocabulario"""
+    def find_similar_words(self, word, k=10, time_budget=0.05):
+        """Encuentra las k palabras más parecidas del vocabulario, incluyendo errores de escritura"""
         if not word:
             return []
-            
-        word_clean = word.strip().lower()
-        similar = []
-        
-        for vocab_word in self.vocab_odam.union(self.vocab_spanish):
-            vocab_lower = vocab_word.lower()
-            if (word_clean in vocab_lower or 
-                vocab_lower in word_clean or 
-                word_clean == vocab_lower):
-                
-                translation = self.word_translations.get(vocab_word, "?")
-                similar.append((vocab_word, translation))
         
+        similar = []
+        for vocab_word, lang in self.fuzzy_index.search(word, k, time_budget=time_budget):
+            translation = self.translate_word(vocab_word, lang) or "?"
+            similar.append((vocab_word, translation))
         return similar
     
     def translate_sentence_word_by_word(self, sentence, source_lang='odam'):
-        """Traduce una oración palabra por palabra"""
+        """Traduce una oración tomando en cada posición la frase más larga del vocabulario.
+        
+        Así frases como 'tai tussadham' o 'jix uam' se traducen completas. Retorna una
+        lista de tramos {'text', 'translation'}, con translation None en las palabras
+        que no están en el vocabulario.
+        """
         if not sentence:
-            return ""
-            
-        words = sentence.split()
-        translated_words = []
+            return []
         
-        for word in words:
-            translation = self.translate_word(word)
-            if translation:
-                translated_words.append(translation)
-            else:
-                # Si no encuentra traducción, mostrar la palabra original entre corchetes
-                translated_words.append(f"[{word}]")
+        if source_lang == 'odam':
+            trie, translations = self.odam_trie, self.odam_to_spanish
+        else:
+            trie, translations = self.spanish_trie, self.spanish_to_odam
         
-        return ' '.join(translated_words)
+        words = sentence.split()
+        tokens = [normalize_word(word.strip(PUNCTUATION)) for word in words]
+        spans = []
+        i = 0
+        while i < len(words):
+            end, phrase = trie.longest_match(tokens, i)
+            if phrase is None:
+                spans.append({'text': words[i], 'translation': None})
+                i += 1
+            else:
+                spans.append({'text': ' '.join(words[i:end]), 'translation': translations[phrase]})
+                i = end
+        return spans
     
     def get_vocabulary_table(self):
         """Retorna el vocabulario en formato de tabla"""
         table = []
         for odam_word in sorted(self.vocab_odam):
-            spanish_word = self.word_translations.get(odam_word, "?")
+            spanish_word = self.odam_to_spanish.get(odam_word, "?")
             table.append({"O'dam": odam_word, "Español": spanish_word})
         return table
     
@@ -177,14 +573,19 @@ class ODamDataManager:
         return self.training_pairs
     
     def save_data(self, filename='data/odam_data.json'):
-        """Guarda todos los datos"""
+        """Compacta el diario en la instantánea, o exporta todos los datos a otro archivo"""
         try:
-            os.makedirs('data', exist_ok=True)
+            if self.journal is not None and filename == self.journal.snapshot_path:
+                self.journal.compact()
+                return True
+            
+            os.makedirs(os.path.dirname(filename) or '.', exist_ok=True)
             data = {
                 'vocab_odam': list(self.vocab_odam),
                 'vocab_spanish': list(self.vocab_spanish),
                 'training_pairs': self.training_pairs,
-                'word_translations': self.word_translations,
+                'odam_to_spanish': self.odam_to_spanish,
+                'spanish_to_odam': self.spanish_to_odam,
                 'grammar_rules': self.grammar_rules
             }
             with open(filename, 'w', encoding='utf-8') as f:
@@ -195,17 +596,23 @@ class ODamDataManager:
             return False
     
     def load_data(self, filename='data/odam_data.json'):
-        """Carga datos existentes"""
+        """Carga la instantánea y reaplica los cambios del diario"""
+        if self.journal is not None:
+            self.journal.close()
+        self.journal = DataJournal(filename)
         try:
-            if os.path.exists(filename):
-                with open(filename, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    self.vocab_odam = set(data['vocab_odam'])
-                    self.vocab_spanish = set(data['vocab_spanish'])
-                    self.training_pairs = data['training_pairs']
-                    self.word_translations = data.get('word_translations', {})
-                    self.grammar_rules = data.get('grammar_rules', {})
-                print(f"✓ Datos cargados: {len(self.vocab_odam)} palabras, {len(self.training_pairs)} oraciones")
+            snapshot, records = self.journal.load()
+            if snapshot is not None or records:
+                data = replay_journal(snapshot or default_data(), records)
+                self.vocab_odam = set(data['vocab_odam'])
+                self.vocab_spanish = set(data['vocab_spanish'])
+                self.training_pairs = data['training_pairs']
+                self.odam_to_spanish = data['odam_to_spanish']
+                self.spanish_to_odam = data['spanish_to_odam']
+                self.grammar_rules = data['grammar_rules']
+                self._build_index()
+                print(f"✓ Datos cargados: {len(self.vocab_odam)} palabras, {len(self.training_pairs)} oraciones"
+                      f" ({len(records)} cambios del diario)")
                 return True
             else:
                 print("❗ No se encontraron datos previos, creando vocabulario base...")
@@ -213,9 +620,18 @@ class ODamDataManager:
                 return True
         except Exception as e:
             print(f"✘ Error cargando datos: {e}")
-            print("❗ Inicializando con vocabulario base...")
-            self.initialize_base_vocabulary()
+            # Si el diario ya tiene cambios el vocabulario base ya se agregó antes, no repetirlo en cada inicio
+            if self.journal.is_empty():
+                print("❗ Inicializando con vocabulario base...")
+                self.initialize_base_vocabulary()
+            else:
+                print("❗ El diario ya tiene cambios, no se agrega de nuevo el vocabulario base")
             return False
+    
+    def close(self):
+        """Sincroniza y cierra el diario"""
+        if self.journal is not None:
+            self.journal.close()
 
 
 class TranslationSystem:
@@ -233,18 +649,20 @@ class ODamTranslator:
         self.data_manager = self.system.get_data_manager()
         self.model = None
     
-    def translate_word_interactive(self, word):
+    def translate_word_interactive(self, word, source_lang='auto'):
         """Traduce una palabra de manera interactiva"""
         if not word or not word.strip():
             print("✘ Por favor ingresa una palabra válida")
             return
             
         word_clean = word.strip()
-        translation = self.data_manager.translate_word(word_clean)
+        if source_lang == 'auto':
+            source_lang = self.data_manager.word_language(word_clean)
+        translation = self.data_manager.translate_word(word_clean, source_lang) if source_lang else None
         
         if translation:
             # Determinar dirección de la traducción
-            if word_clean in self.data_manager.vocab_odam:
+            if source_lang == 'odam':
                 print(f"✓ O'dam -> Español: '{word_clean}' -> '{translation}'")
             else:
                 print(f"✓ Español -> O'dam: '{word_clean}' -> '{translation}'")
@@ -270,23 +688,30 @@ class ODamTranslator:
         
         # Detectar idioma automáticamente si no se especifica
         if source_lang == 'auto':
-            # Si contiene caracteres típicos del O'dam, asumir que es O'dam
-            if any(char in sentence_clean for char in ["'", "+", "ñ", "x"]):
+            # Contar cuántas palabras de la oración cubre el vocabulario de cada idioma
+            covered = {}
+            for lang in ('odam', 'español'):
+                spans = self.data_manager.translate_sentence_word_by_word(sentence_clean, lang)
+                covered[lang] = sum(len(span['text'].split()) for span in spans if span['translation'] is not None)
+            if covered['odam'] != covered['español']:
+                source_lang = 'odam' if covered['odam'] > covered['español'] else 'español'
+            # Si empatan, y contiene caracteres típicos del O'dam, asumir que es O'dam
+            elif any(char in sentence_clean for char in ["'", "+", "ɨ", "ñ", "x"]):
                 source_lang = 'odam'
-                target_lang = 'español'
             else:
                 source_lang = 'español'
-                target_lang = 'odam'
+        target_lang = 'español' if source_lang == 'odam' else 'odam'
         
-        translation = self.data_manager.translate_sentence_word_by_word(sentence_clean, source_lang)
+        spans = self.data_manager.translate_sentence_word_by_word(sentence_clean, source_lang)
+        # Si no encuentra traducción, mostrar el texto original entre corchetes
+        translation = ' '.join(span['translation'] or f"[{span['text']}]" for span in spans)
         
         print(f"   Traducción ({source_lang} -> {target_lang}):")
         print(f"   Original: '{sentence_clean}'")
         print(f"   Traducción: '{translation}'")
         
         # Mostrar palabras no encontradas
-        unknown_words = [word for word in sentence_clean.split() 
-                        if f"[{word}]" in translation]
+        unknown_words = [span['text'] for span in spans if span['translation'] is None]
         if unknown_words:
             print(f"⚠️  Palabras no encontradas: {', '.join(unknown_words)}")
             print("💡 Sugerencia: Agrega estas palabras al vocabulario")
@@ -359,14 +784,14 @@ def translation_demo(translator):
         elif choice == '3':
             word = input("Palabra en O'dam a traducir: ").strip()
             if word:
-                translator.translate_word_interactive(word)
+                translator.translate_word_interactive(word, 'odam')
             else:
                 print("✘ Por favor ingresa una palabra")
                 
         elif choice == '4':
             word = input("Palabra en Español a traducir: ").strip()
             if word:
-                translator.translate_word_interactive(word)
+                translator.translate_word_interactive(word, 'español')
             else:
                 print("✘ Por favor ingresa una palabra")
                 
@@ -455,6 +880,7 @@ def main_demo():
                 print("\n✓ Todos los datos han sido guardados exitosamente")
             else:
                 print("\nHubo un problema al guardar los datos")
+            data_manager.close()
             
             # Mostrar resumen final
             print("\n--- RESUMEN FINAL ---")
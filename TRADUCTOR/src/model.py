@@ -20,13 +20,17 @@ class ODamTranslator(tf.keras.Model):
         self.attention = tf.keras.layers.Attention()
         self.output_layer = tf.keras.layers.Dense(vocab_size_tgt, activation='softmax')
         
+    def _encode(self, source):
+        enc_embed = self.encoder_embedding(source)
+        enc_output, forward_state, backward_state = self.encoder_gru(enc_embed)
+        enc_state = tf.concat([forward_state, backward_state], axis=-1)
+        return enc_output, enc_state
+    
     def call(self, inputs):
         source, target = inputs
         
         # Encoder
-        enc_embed = self.encoder_embedding(source)
-        enc_output, forward_state, backward_state = self.encoder_gru(enc_embed)
-        enc_state = tf.concat([forward_state, backward_state], axis=-1)
+        enc_output, enc_state = self._encode(source)
         
         # Decoder
         dec_embed = self.decoder_embedding(target)
@@ -40,6 +44,24 @@ class ODamTranslator(tf.keras.Model):
         output = self.output_layer(combined)
         
         return output
+    
+    @tf.function
+    def encode(self, source):
+        """Corre el encoder una vez por oración: retorna (salidas del encoder, estado inicial del decoder)"""
+        return self._encode(source)
+    
+    @tf.function
+    def decode_step(self, token, state, enc_output):
+        """Avanza el decoder un token con su estado y las salidas del encoder ya calculadas.
+        
+        Retorna (probabilidades del siguiente token, nuevo estado). La atención solo mira
+        las salidas del encoder, así que cada paso da lo mismo que call() en esa posición.
+        """
+        dec_embed = self.decoder_embedding(token)
+        dec_output, state = self.decoder_gru(dec_embed, initial_state=state)
+        context_vector = self.attention([dec_output, enc_output])
+        combined = tf.concat([dec_output, context_vector], axis=-1)
+        return self.output_layer(combined)[:, -1, :], state
 
 class TranslationSystem:
     def __init__(self):
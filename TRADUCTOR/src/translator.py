@@ -2,6 +2,7 @@
 import tensorflow as tf
 import numpy as np
 import pickle
+from .model import ODamTranslator as ODamModel
 
 class ODamTranslator:
     def __init__(self):
@@ -9,11 +10,14 @@ class ODamTranslator:
         self.vectorizer_odam = None
         self.vectorizer_spanish = None
         self.spanish_vocab = None
+        self.start_id = None
+        self.end_id = None
         
     def load_model(self):
         """Carga el modelo y vectorizadores entrenados"""
         try:
-            self.model = tf.keras.models.load_model('models/odam_translator.h5')
+            self.model = tf.keras.models.load_model('models/odam_translator.h5',
+                                                    custom_objects={'ODamTranslator': ODamModel})
             
             with open('models/vectorizers/odam_vectorizer.pkl', 'rb') as f:
                 self.vectorizer_odam = pickle.load(f)
@@ -22,6 +26,10 @@ class ODamTranslator:
                 self.vectorizer_spanish = pickle.load(f)
                 
             self.spanish_vocab = self.vectorizer_spanish.get_vocabulary()
+            
+            # Ids de los tokens especiales, calculados una sola vez
+            self.start_id = int(self.vectorizer_spanish(["[start]"])[0][0])
+            self.end_id = int(self.vectorizer_spanish(["[end]"])[0][0])
             return True
             
         except Exception as e:
@@ -36,22 +44,23 @@ class ODamTranslator:
         # Vectorizar entrada
         input_seq = self.vectorizer_odam([odam_sentence])
         
-        # Token de inicio
-        start_token = [self.vectorizer_spanish(["[start]"])[0][0]]
+        # El encoder corre una sola vez; el decoder avanza un token por paso llevando su estado
+        enc_output, state = self.model.encode(input_seq)
         
         # Decodificación greedy
         decoded_tokens = []
-        current_token = start_token[0]
+        current_token = tf.constant([[self.start_id]], dtype=tf.int64)
         
         for _ in range(15):  # Longitud máxima
-            predictions = self.model.predict([input_seq, [decoded_tokens]], verbose=0)
-            predicted_id = np.argmax(predictions[0, -1, :])
+            predictions, state = self.model.decode_step(current_token, state, enc_output)
+            predicted_id = int(np.argmax(predictions[0]))
             
-            if predicted_id == self.vectorizer_spanish(["[end]"])[0][0]:
+            # El relleno (0) también marca el final, las oraciones de entrenamiento no llevan [end]
+            if predicted_id in (self.end_id, 0):
                 break
                 
             decoded_tokens.append(predicted_id)
-            current_token = predicted_id
+            current_token = tf.constant([[predicted_id]], dtype=tf.int64)
         
         # Convertir a texto
         decoded_text = ' '.join([self.spanish_vocab[token] for token in decoded_tokens])
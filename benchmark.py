@@ -0,0 +1,140 @@
+import os
+import sys
+import csv
+import json
+import argparse
+import itertools
+
+from detector.backends import BACKENDS
+from detector.benchmark import agreement, load_detections, run_config
+
+# Define and parse user input arguments
+
+parser = argparse.ArgumentParser(description='Benchmark yolo_detect.py headless over a fixed image or video corpus across backends, input sizes, batch sizes and thread counts.')
+parser.add_argument('--model', help='Path to YOLO model file (example: "runs/detect/train/weights/best.pt")',
+                    required=True)
+parser.add_argument('--source', help='Benchmark corpus: an image folder, image file or video file that stays the same between runs (example: "bench_corpus")',
+                    required=True)
+parser.add_argument('--backends', help='Comma-separated backends to run (example: "pytorch,onnx,openvino")',
+                    default='pytorch,onnx')
+parser.add_argument('--imgsz', help='Comma-separated inference input sizes (example: "320,480,640")',
+                    default='320,480,640')
+parser.add_argument('--batch', help='Comma-separated batch sizes, 0 for the frame-by-frame loop (example: "0,4,8")',
+                    default='0,4')
+parser.add_argument('--threads', help='Comma-separated intra-op thread counts for onnx and openvino, 0 lets the runtime decide (example: "0,2,4")',
+                    default='0')
+parser.add_argument('--thresh', help='Minimum confidence threshold for detections (example: "0.4")',
+                    type=float, default=0.5)
+parser.add_argument('--reference', help='JSON Lines detections of a trusted earlier run to measure agreement against, \
+                    otherwise the first configuration of the sweep is the reference',
+                    default=None)
+parser.add_argument('--iou', help='IoU at which a box matches the reference box of the same class (example: "0.5")',
+                    type=float, default=0.5)
+parser.add_argument('--workdir', help='Folder for the detections, metrics and logs of each run',
+                    default='benchmark_runs')
+parser.add_argument('--report', help='File to write the JSON benchmark report to',
+                    default='benchmark_report.json')
+parser.add_argument('--csv', help='File to write one CSV row per configuration to',
+                    default='benchmark_report.csv')
+
+args = parser.parse_args()
+
+
+def int_list(value):
+    return [int(v) for v in value.split(',') if v.strip()]
+
+
+# Check if model and corpus exist and the sweep is valid
+if (not os.path.exists(args.model)):
+    print('ERROR: Model path is invalid or model was not found. Make sure the model filename was entered correctly.')
+    sys.exit(0)
+if (not os.path.exists(args.source)):
+    print(f'Benchmark corpus {args.source} was not found. Please try again.')
+    sys.exit(0)
+if args.reference and not os.path.exists(args.reference):
+    print(f'Reference detections {args.reference} were not found. Please try again.')
+    sys.exit(0)
+
+backends = [b.strip() for b in args.backends.split(',') if b.strip()]
+if any(b not in BACKENDS for b in backends):
+    print(f'Backends must be among {", ".join(BACKENDS)}. Please try again.')
+    sys.exit(0)
+
+# The PyTorch backend has no thread setting, so it is only run once per size and batch
+configs = []
+for backend, imgsz, batch in itertools.product(backends, int_list(args.imgsz), int_list(args.batch)):
+    for threads in ([0] if backend == 'pytorch' else int_list(args.threads)):
+        configs.append({'backend': backend, 'imgsz': imgsz, 'batch': batch, 'threads': threads})
+
+os.makedirs(args.workdir, exist_ok=True)
+script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'yolo_detect.py')
+
+# Run every configuration in its own process, so peak memory and start-up state are not shared
+results = []
+for i, config in enumerate(configs):
+    print(f'[{i+1}/{len(configs)}] backend={config["backend"]} imgsz={config["imgsz"]} batch={config["batch"]} threads={config["threads"]}')
+    result = run_config(script, args.model, args.source, config, args.workdir, args.thresh)
+    if 'error' in result:
+        print(f'  {result["error"]}')
+    else:
+        inference = result['stages_ms'].get('inference', {})
+        print(f'  {result["fps"]:.2f} FPS over {result["frames"]} frames, inference p50 {inference.get("p50", 0):.1f} ms, '
+              f'p95 {inference.get("p95", 0):.1f} ms, peak RSS {result["peak_rss_mb"]:.0f} MB')
+    results.append(result)
+
+# Compare the detections of every run against the reference
+class_ids = {}
+reference_path = args.reference
+if reference_path is None:
+    reference_path = next((r['output'] for r in results if 'error' not in r), None)
+if reference_path is not None:
+    reference = load_detections(reference_path, class_ids)
+    for result in results:
+        if 'error' not in result:
+            result['agreement'] = agreement(load_detections(result['output'], class_ids), reference, args.iou)
+
+report = {
+    'model': args.model,
+    'source': args.source,
+    'thresh': args.thresh,
+    'reference': reference_path,
+    'iou': args.iou,
+    'runs': results,
+}
+
+# Print and save report
+print('\n--- BENCHMARK REPORT ---')
+print(f'{"Configuration":<28} {"FPS":>8} {"infer p50":>10} {"infer p95":>10} {"RSS MB":>8} {"F1":>6}')
+for result in results:
+    if 'error' in result:
+        print(f'{result["name"]:<28} {"failed":>8}')
+        continue
+    inference = result['stages_ms'].get('inference', {})
+    f1 = result.get('agreement', {}).get('f1', 0.0)
+    print(f'{result["name"]:<28} {result["fps"]:>8.2f} {inference.get("p50", 0):>10.1f} {inference.get("p95", 0):>10.1f} '
+          f'{result["peak_rss_mb"]:>8.0f} {f1:>6.3f}')
+
+with open(args.report, 'w', encoding='utf-8') as f:
+    json.dump(report, f, indent=2)
+print(f'Report saved to {args.report}')
+
+# One flat row per configuration, with p50/p95/p99 columns for every stage any run reported
+stages = []
+for result in results:
+    for stage in result.get('stages_ms', {}):
+        if stage not in stages:
+            stages.append(stage)
+fields = ['name', 'backend', 'imgsz', 'batch', 'threads', 'frames', 'fps', 'wall_seconds', 'peak_rss_mb',
+          'precision', 'recall', 'f1', 'error']
+fields += [f'{stage}_{q}_ms' for stage in stages for q in ('p50', 'p95', 'p99')]
+with open(args.csv, 'w', newline='', encoding='utf-8') as f:
+    csv_writer = csv.DictWriter(f, fieldnames=fields)
+    csv_writer.writeheader()
+    for result in results:
+        row = {k: result.get(k, '') for k in ['name', 'backend', 'imgsz', 'batch', 'threads', 'frames', 'fps',
+                                              'wall_seconds', 'peak_rss_mb', 'error']}
+        row.update({k: result.get('agreement', {}).get(k, '') for k in ('precision', 'recall', 'f1')})
+        for stage, s in result.get('stages_ms', {}).items():
+            row.update({f'{stage}_{q}_ms': s[q] for q in ('p50', 'p95', 'p99')})
+        csv_writer.writerow(row)
+print(f'CSV saved to {args.csv}')
@@ -0,0 +1,59 @@
+import os
+import sys
+import argparse
+
+from detector.backends import BACKENDS, load_backend, warm_up
+from detector.metrics import StageMetrics
+from detector.postprocess import label_array
+from detector.service import DetectionService
+
+# Define and parse user input arguments
+
+parser = argparse.ArgumentParser(description='Serve fire/smoke detections to local clients over HTTP and/or a Unix socket, with one model loaded once.')
+parser.add_argument('--model', help='Path to YOLO model file (example: "runs/detect/train/weights/best.pt")',
+                    required=True)
+parser.add_argument('--thresh', help='Minimum confidence threshold of returned detections, clients may only ask for a higher one (example: "0.4")',
+                    type=float, default=0.5)
+parser.add_argument('--backend', help='Inference backend: "pytorch" (default), "onnx" (onnxruntime CPU) or "openvino"',
+                    choices=BACKENDS, default='pytorch')
+parser.add_argument('--imgsz', help='Inference input size in pixels, matching the training imgsz by default (example: "480")',
+                    type=int, default=480)
+parser.add_argument('--dynamic', help='Export the ONNX/OpenVINO model with dynamic input shapes',
+                    action='store_true')
+parser.add_argument('--threads', help='Number of intra-op CPU threads for the onnx and openvino backends (default: runtime decides)',
+                    type=int, default=0)
+parser.add_argument('--host', help='Address to listen on. Keep the default to only accept clients on this machine',
+                    default='127.0.0.1')
+parser.add_argument('--port', help='TCP port to serve HTTP on (example: "8080")',
+                    type=int, default=None)
+parser.add_argument('--socket', help='Unix domain socket path to serve HTTP on (example: "/tmp/firewatch.sock")',
+                    default=None)
+parser.add_argument('--max-batch', help='Maximum number of images of concurrent requests inferred together (example: "8")',
+                    type=int, default=8)
+parser.add_argument('--max-wait', help='Milliseconds an image may wait for other requests to fill its batch (example: "10")',
+                    type=float, default=10.0)
+parser.add_argument('--max-body', help='Maximum request size in MB (example: "32")',
+                    type=int, default=32)
+
+args = parser.parse_args()
+
+# Check if model file exists and a listening address was given
+if (not os.path.exists(args.model)):
+    print('ERROR: Model path is invalid or model was not found. Make sure the model filename was entered correctly.')
+    sys.exit(0)
+if not args.port and not args.socket:
+    print('Please specify a --port and/or a --socket to serve on.')
+    sys.exit(0)
+
+# Load the model into memory once and get labelmap
+metrics = StageMetrics()
+model = load_backend(args.model, args.backend, args.imgsz, args.dynamic, args.threads)
+label_names = label_array(model.names)
+
+# Warm up before listening, so the first client request does not pay the one-time setup costs
+warm_up(model, (args.imgsz, args.imgsz))
+model.metrics = metrics
+
+service = DetectionService(model, label_names, metrics, args.thresh, args.max_batch, args.max_wait / 1000,
+                           args.max_body << 20)
+service.serve(args.host, args.port, args.socket)
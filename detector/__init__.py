@@ -0,0 +1 @@
+# Helper modules for yolo_detect.py
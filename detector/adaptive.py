@@ -0,0 +1,87 @@
+import time
+from collections import deque
+
+import numpy as np
+
+
+class AdaptiveController:
+    """Keeps inference within a frame-rate and/or latency budget by trading resolution and frame skip.
+
+    The median inference time over the last `window` inferred frames is compared with
+    the budget: at most 1/target_fps seconds of inference per frame (skipped frames
+    cost nothing) and at most target_latency seconds per inference. Over budget by more
+    than the hysteresis fraction, the controller first steps imgsz down through `sizes`
+    and only then starts skipping frames; comfortably under budget, it first stops
+    skipping and then steps imgsz back up, predicting the cost of a larger size from
+    the pixel count. After every change the window is cleared, so each decision is
+    based on measurements taken at the current setting only.
+    """
+
+    def __init__(self, backend, sizes, target_fps=None, target_latency=None, hysteresis=0.15,
+                 window=15, max_skip=5, log=print):
+        self.backend = backend
+        self.sizes = sorted(set(sizes), reverse=True)
+        self.target_fps = target_fps
+        self.target_latency = target_latency
+        self.hysteresis = hysteresis
+        self.max_skip = max_skip
+        self.log = log
+        self.level = self.sizes.index(backend.imgsz) if backend.imgsz in self.sizes else 0
+        self.backend.imgsz = self.sizes[self.level]
+        self.skip = 0
+        self.skipped_in_row = 0
+        self.frames_skipped = 0
+        self.samples = deque(maxlen=window)
+        self.decisions = []
+
+    @property
+    def imgsz(self):
+        return self.sizes[self.level]
+
+    def should_infer(self):
+        """Return True if the detector should run on this frame, False to reuse the last detections."""
+        if self.skipped_in_row < self.skip:
+            self.skipped_in_row = self.skipped_in_row + 1
+            self.frames_skipped = self.frames_skipped + 1
+            return False
+        self.skipped_in_row = 0
+        return True
+
+    def _within(self, latency, skip, margin):
+        if self.target_fps and latency / (skip + 1) > margin / self.target_fps:
+            return False
+        if self.target_latency and latency > margin * self.target_latency:
+            return False
+        return True
+
+    def _decide(self, reason, latency, imgsz, skip):
+        decision = {'time': round(time.time(), 3), 'reason': reason, 'median_ms': round(latency * 1000, 1),
+                    'imgsz': [self.imgsz, imgsz], 'skip': [self.skip, skip]}
+        self.log(f'Adaptive control: {reason}, median inference {latency*1000:.0f} ms: '
+                 f'imgsz {self.imgsz} -> {imgsz}, skip {self.skip} -> {skip}')
+        self.decisions.append(decision)
+        self.level = self.sizes.index(imgsz)
+        self.backend.imgsz = imgsz
+        self.skip = skip
+        self.samples.clear()
+
+    def update(self, seconds):
+        """Record the inference time of one inferred frame and adjust imgsz and skip when the window is full."""
+        self.samples.append(seconds)
+        if len(self.samples) < self.samples.maxlen:
+            return
+        latency = float(np.median(self.samples))
+
+        if not self._within(latency, self.skip, 1 + self.hysteresis):
+            if self.level < len(self.sizes) - 1:
+                self._decide('over budget', latency, self.sizes[self.level + 1], self.skip)
+            elif self.target_fps and self.skip < self.max_skip:
+                self._decide('over budget at smallest imgsz', latency, self.imgsz, self.skip + 1)
+            return
+
+        if self.skip > 0 and self._within(latency, self.skip - 1, 1 - self.hysteresis):
+            self._decide('under budget', latency, self.imgsz, self.skip - 1)
+        elif self.skip == 0 and self.level > 0:
+            larger = self.sizes[self.level - 1]
+            if self._within(latency * (larger / self.imgsz) ** 2, 0, 1 - self.hysteresis):
+                self._decide('under budget', latency, larger, 0)
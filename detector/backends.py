@@ -0,0 +1,277 @@
+import os
+import ast
+import time
+import shutil
+
+import cv2
+import numpy as np
+
+from detector.postprocess import Detections, batched_nms, extract_detections
+
+BACKENDS = ['pytorch', 'onnx', 'openvino']
+
+# IoU threshold used by Ultralytics' own NMS, reused so all backends agree
+NMS_IOU = 0.7
+
+
+def exported_model_path(model_path, backend, imgsz, dynamic):
+    """Where the export of model_path for a backend lives. Exports sit next to the .pt weights."""
+    stem, _ = os.path.splitext(model_path)
+    suffix = f'_{imgsz}' + ('_dynamic' if dynamic else '')
+    if backend == 'onnx':
+        return stem + suffix + '.onnx'
+    elif backend == 'openvino':
+        return stem + suffix + '_openvino_model'
+
+
+def export_model(model_path, backend, imgsz=480, dynamic=False):
+    """Export PyTorch weights to ONNX or OpenVINO IR and return the path of the exported model.
+
+    The export is reused as long as it is newer than the weights it was made from.
+    """
+    export_path = exported_model_path(model_path, backend, imgsz, dynamic)
+    if os.path.exists(export_path) and os.path.getmtime(export_path) >= os.path.getmtime(model_path):
+        return export_path
+
+    from ultralytics import YOLO
+    print(f'Exporting {model_path} to {backend} (imgsz={imgsz}, dynamic={dynamic})...')
+    exported = YOLO(model_path, task='detect').export(format=backend, imgsz=imgsz, dynamic=dynamic)
+
+    # Ultralytics names the export after the weights, rename it so each imgsz/dynamic variant gets its own file
+    if os.path.exists(export_path):
+        if os.path.isdir(export_path):
+            shutil.rmtree(export_path)
+        else:
+            os.remove(export_path)
+    os.rename(exported, export_path)
+    return export_path
+
+
+def load_backend(model_path, backend='pytorch', imgsz=480, dynamic=False, threads=0):
+    """Load a detector for the requested backend, exporting .pt weights first if needed."""
+    if backend == 'pytorch':
+        return UltralyticsBackend(model_path, imgsz)
+
+    if model_path.endswith('.pt'):
+        model_path = export_model(model_path, backend, imgsz, dynamic)
+    if backend == 'onnx':
+        return OnnxBackend(model_path, imgsz, threads)
+    elif backend == 'openvino':
+        return OpenVinoBackend(model_path, imgsz, threads)
+    raise ValueError(f'Backend {backend} is not supported.')
+
+
+def warm_up(backend, shape, batch=1, runs=1):
+    """Run a backend on blank frames of shape (h, w) and return the seconds it took.
+
+    The first inferences pay one-time costs (memory allocation, kernel selection, lazy
+    predictor setup in Ultralytics), so doing them before the first real frame keeps
+    them out of the first detection. Metrics are detached meanwhile so warm-up runs
+    do not show up in the stage latencies.
+    """
+    frames = [np.zeros((shape[0], shape[1], 3), dtype=np.uint8) for _ in range(batch)]
+    metrics, backend.metrics = backend.metrics, None
+    t_start = time.perf_counter()
+    try:
+        for _ in range(runs):
+            backend.predict(frames, 1.0)
+    finally:
+        backend.metrics = metrics
+    return time.perf_counter() - t_start
+
+
+class UltralyticsBackend:
+    """Runs the model through Ultralytics' own predictor (PyTorch weights)."""
+
+    def __init__(self, model_path, imgsz=480):
+        from ultralytics import YOLO
+        self.model = YOLO(model_path, task='detect')
+        self.names = self.model.names
+        self.imgsz = imgsz
+        self.metrics = None
+
+    def predict(self, frames, conf):
+        """Run inference on a list of frames and return one Detections per frame."""
+        results = self.model(frames, conf=conf, imgsz=self.imgsz, verbose=False)
+        t_start = time.perf_counter()
+        detections = [extract_detections(result.boxes, conf) for result in results]
+
+        # Ultralytics already times its own stages per image, in milliseconds
+        if self.metrics is not None:
+            t_extract = (time.perf_counter() - t_start) / len(frames)
+            for result in results:
+                self.metrics.record('preprocess', result.speed['preprocess'] / 1000)
+                self.metrics.record('inference', result.speed['inference'] / 1000)
+                self.metrics.record('postprocess', result.speed['postprocess'] / 1000 + t_extract)
+        return detections
+
+
+def letterbox(frame, new_shape, auto, stride=32):
+    """Resize a frame keeping its aspect ratio and pad it to new_shape (h, w).
+
+    With auto=True the padding is reduced to the next multiple of stride, which only
+    works with models exported with dynamic input shapes. Returns the padded image,
+    the resize ratio and the (left, top) padding.
+    """
+    h, w = frame.shape[:2]
+    r = min(new_shape[0] / h, new_shape[1] / w)
+    new_w, new_h = int(round(w * r)), int(round(h * r))
+    dw, dh = new_shape[1] - new_w, new_shape[0] - new_h
+    if auto:
+        dw, dh = dw % stride, dh % stride
+    left, top = dw // 2, dh // 2
+
+    if (w, h) != (new_w, new_h):
+        frame = cv2.resize(frame, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+    frame = cv2.copyMakeBorder(frame, top, dh - top, left, dw - left, cv2.BORDER_CONSTANT, value=(114, 114, 114))
+    return frame, r, (left, top)
+
+
+class ExportedBackend:
+    """Shared pre- and post-processing for YOLO models exported to ONNX or OpenVINO.
+
+    Subclasses set self.names, self.fixed_shape ((h, w) of a fixed-size export or None
+    for a dynamic one), self.max_batch (None if the batch dimension is dynamic) and
+    implement _forward(blob) -> (B, 4 + num_classes, num_anchors) array.
+    """
+
+    def __init__(self, imgsz):
+        self.imgsz = imgsz
+        self.fixed_shape = None
+        self.max_batch = 1
+        self.metrics = None
+
+    def preprocess(self, frames):
+        # Dynamic models get a minimal stride-aligned letterbox when the batch holds a single frame
+        shape = self.fixed_shape or (self.imgsz, self.imgsz)
+        auto = self.fixed_shape is None and len(frames) == 1
+        imgs, ratios, pads = [], [], []
+        for frame in frames:
+            img, r, pad = letterbox(frame, shape, auto)
+            imgs.append(img)
+            ratios.append(r)
+            pads.append(pad)
+        # BGR HWC uint8 -> RGB NCHW float32 in [0, 1]
+        blob = np.stack(imgs)[..., ::-1].transpose(0, 3, 1, 2)
+        blob = np.ascontiguousarray(blob, dtype=np.float32) / 255.0
+        return blob, ratios, pads
+
+    def postprocess(self, output, frame, ratio, pad, conf_thresh):
+        pred = output.T  # (num_anchors, 4 + num_classes)
+        scores = pred[:, 4:]
+        cls = scores.argmax(axis=1)
+        conf = scores[np.arange(len(cls)), cls]
+        keep = conf >= conf_thresh
+        if not keep.any():
+            return Detections.empty()
+        pred, cls, conf = pred[keep], cls[keep], conf[keep]
+
+        # Boxes are (cx, cy, w, h) in letterboxed input pixels
+        xyxy = np.empty((len(pred), 4), dtype=np.float32)
+        xyxy[:, 0] = pred[:, 0] - pred[:, 2] / 2
+        xyxy[:, 1] = pred[:, 1] - pred[:, 3] / 2
+        xyxy[:, 2] = pred[:, 0] + pred[:, 2] / 2
+        xyxy[:, 3] = pred[:, 1] + pred[:, 3] / 2
+        detections = batched_nms(Detections(xyxy, conf.astype(np.float32), cls), NMS_IOU)
+
+        # Map boxes back onto the original frame
+        h, w = frame.shape[:2]
+        detections.xyxy = (detections.xyxy - np.array([pad[0], pad[1], pad[0], pad[1]], dtype=np.float32)) / ratio
+        detections.xyxy[:, [0, 2]] = detections.xyxy[:, [0, 2]].clip(0, w)
+        detections.xyxy[:, [1, 3]] = detections.xyxy[:, [1, 3]].clip(0, h)
+        return detections
+
+    def predict(self, frames, conf):
+        """Run inference on a list of frames and return one Detections per frame."""
+        if self.max_batch is not None and len(frames) > self.max_batch:
+            detections = []
+            for i in range(0, len(frames), self.max_batch):
+                detections.extend(self.predict(frames[i:i + self.max_batch], conf))
+            return detections
+
+        t_start = time.perf_counter()
+        blob, ratios, pads = self.preprocess(frames)
+        t_preprocessed = time.perf_counter()
+        outputs = self._forward(blob)
+        t_inferred = time.perf_counter()
+        detections = [self.postprocess(outputs[i], frames[i], ratios[i], pads[i], conf) for i in range(len(frames))]
+        t_stop = time.perf_counter()
+
+        # Stage times are recorded per frame, so batched and single-frame runs are comparable
+        if self.metrics is not None:
+            for _ in frames:
+                self.metrics.record('preprocess', (t_preprocessed - t_start) / len(frames))
+                self.metrics.record('inference', (t_inferred - t_preprocessed) / len(frames))
+                self.metrics.record('postprocess', (t_stop - t_inferred) / len(frames))
+        return detections
+
+
+class OnnxBackend(ExportedBackend):
+    """Runs an ONNX export through onnxruntime's CPU execution provider."""
+
+    def __init__(self, model_path, imgsz=480, threads=0):
+        super().__init__(imgsz)
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+
+        # Graph optimizations are applied once and the optimized graph is saved next to the model,
+        # later starts load it as is. It is reused as long as it is newer than the model it was made from
+        optimized_path = os.path.splitext(model_path)[0] + '.optimized.onnx'
+        if os.path.exists(optimized_path) and os.path.getmtime(optimized_path) >= os.path.getmtime(model_path):
+            options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_DISABLE_ALL
+            model_path = optimized_path
+        else:
+            options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+            if os.access(os.path.dirname(os.path.abspath(optimized_path)), os.W_OK):
+                options.optimized_model_filepath = optimized_path
+        if threads:
+            options.intra_op_num_threads = threads
+            options.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(model_path, sess_options=options, providers=['CPUExecutionProvider'])
+        self.input_name = self.session.get_inputs()[0].name
+
+        # Exported dimensions are ints for fixed shapes and strings for dynamic ones
+        batch, _, h, w = self.session.get_inputs()[0].shape
+        self.max_batch = batch if isinstance(batch, int) else None
+        self.fixed_shape = (h, w) if isinstance(h, int) and isinstance(w, int) else None
+
+        # Ultralytics stores the labelmap in the model metadata as a dict literal
+        metadata = self.session.get_modelmeta().custom_metadata_map
+        self.names = ast.literal_eval(metadata['names'])
+
+    def _forward(self, blob):
+        return self.session.run(None, {self.input_name: blob})[0]
+
+
+class OpenVinoBackend(ExportedBackend):
+    """Runs an OpenVINO IR export on the CPU plugin."""
+
+    def __init__(self, model_dir, imgsz=480, threads=0):
+        super().__init__(imgsz)
+        import yaml
+        import openvino as ov
+
+        core = ov.Core()
+        xml_path = [f for f in os.listdir(model_dir) if f.endswith('.xml')][0]
+
+        # The compiled blob is cached inside the model folder. Compiling from the path lets later
+        # starts skip reading the IR and map the cached blob from disk instead of compiling again
+        config = {'PERFORMANCE_HINT': 'LATENCY'}
+        if threads:
+            config['INFERENCE_NUM_THREADS'] = threads
+        if os.access(model_dir, os.W_OK):
+            config['CACHE_DIR'] = os.path.join(model_dir, 'cache')
+        self.compiled = core.compile_model(os.path.join(model_dir, xml_path), 'CPU', config)
+
+        input_shape = self.compiled.input(0).get_partial_shape()
+        self.max_batch = input_shape[0].get_length() if input_shape[0].is_static else None
+        if input_shape[2].is_static and input_shape[3].is_static:
+            self.fixed_shape = (input_shape[2].get_length(), input_shape[3].get_length())
+
+        with open(os.path.join(model_dir, 'metadata.yaml'), 'r', encoding='utf-8') as f:
+            self.names = yaml.safe_load(f)['names']
+
+    def _forward(self, blob):
+        return self.compiled(blob)[0]
@@ -0,0 +1,119 @@
+import os
+import re
+import sys
+import json
+import time
+import subprocess
+from collections import defaultdict
+
+import numpy as np
+
+from detector.evaluate import match_predictions
+from detector.postprocess import Detections
+
+PROMETHEUS_LINE = re.compile(r'^(\w+)\{([^}]*)\} (\S+)$')
+
+
+def parse_prometheus(text):
+    """Read the stage summaries written by MetricsExporter back into {stage: {count, sum, p50, p95, p99}} (seconds)."""
+    stages = defaultdict(dict)
+    for line in text.splitlines():
+        match = PROMETHEUS_LINE.match(line)
+        if not match:
+            continue
+        name, labels, value = match.groups()
+        labels = dict(re.findall(r'(\w+)="([^"]*)"', labels))
+        if 'stage' not in labels:
+            continue
+        stage = stages[labels['stage']]
+        if name == 'firewatch_stage_seconds':
+            stage[f'p{int(float(labels["quantile"]) * 100)}'] = float(value)
+        elif name == 'firewatch_stage_seconds_sum':
+            stage['sum'] = float(value)
+        elif name == 'firewatch_stage_seconds_count':
+            stage['count'] = int(value)
+    return dict(stages)
+
+
+def load_detections(path, class_ids):
+    """Read a JSON Lines detection stream into {(frame, source): Detections}.
+
+    Class names are mapped to indices through class_ids, which is extended with
+    names not seen before, so runs loaded with the same dict are comparable.
+    """
+    boxes = defaultdict(list)
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            record = json.loads(line)
+            cls = class_ids.setdefault(record['class'], len(class_ids))
+            boxes[(record['frame'], record['source'])].append((record['xyxy'], record['confidence'], cls))
+    return {key: Detections(np.array([b[0] for b in rows], dtype=np.float32).reshape(-1, 4),
+                            np.array([b[1] for b in rows], dtype=np.float32),
+                            np.array([b[2] for b in rows], dtype=int))
+            for key, rows in boxes.items()}
+
+
+def agreement(detections, reference, iou_thresh=0.5):
+    """Precision, recall and F1 of a run's boxes against a reference run's, matched per frame by class and IoU."""
+    matched, total, total_ref = 0, 0, 0
+    for key in set(detections) | set(reference):
+        det = detections.get(key, Detections.empty())
+        ref = reference.get(key, Detections.empty())
+        matched = matched + int(match_predictions(det, ref.cls, ref.xyxy, iou_thresh).sum())
+        total = total + len(det)
+        total_ref = total_ref + len(ref)
+    precision = matched / total if total else 1.0
+    recall = matched / total_ref if total_ref else 1.0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    return {'precision': precision, 'recall': recall, 'f1': f1, 'boxes': total, 'reference_boxes': total_ref}
+
+
+def run_config(script, model, source, config, run_dir, thresh=0.5):
+    """Run yolo_detect.py headless with one configuration and collect its results.
+
+    Returns a dict with the configuration, wall time, peak RSS of the process, the
+    per-stage latencies from its metrics file and the path of its detection stream,
+    or an 'error' entry instead of the measurements if the run failed.
+    """
+    name = f'{config["backend"]}_{config["imgsz"]}_b{config["batch"]}_t{config["threads"]}'
+    output = os.path.join(run_dir, name + '.jsonl')
+    metrics_file = os.path.join(run_dir, name + '.prom')
+    log_file = os.path.join(run_dir, name + '.log')
+    for path in (output, metrics_file):
+        if os.path.exists(path):
+            os.remove(path)
+
+    cmd = [sys.executable, script, '--model', model, '--source', source, '--headless',
+           '--output', output, '--thresh', str(thresh), '--backend', config['backend'],
+           '--imgsz', str(config['imgsz']), '--threads', str(config['threads']),
+           '--metrics-file', metrics_file, '--metrics-interval', '3600']
+    if config['batch']:
+        cmd += ['--batch', str(config['batch'])]
+
+    t_start = time.perf_counter()
+    with open(log_file, 'w', encoding='utf-8') as log:
+        process = subprocess.Popen(cmd, stdout=log, stderr=subprocess.STDOUT)
+        # wait4 reports the resource usage of this child alone, including its peak RSS
+        _, status, usage = os.wait4(process.pid, 0)
+        process.returncode = os.waitstatus_to_exitcode(status)
+    wall = time.perf_counter() - t_start
+
+    # yolo_detect.py exits with status 0 on invalid arguments too, a missing metrics file tells them apart
+    result = {'name': name, **config, 'wall_seconds': wall, 'output': output, 'log': log_file}
+    if process.returncode != 0 or not os.path.exists(metrics_file):
+        result['error'] = f'run failed, see {log_file}'
+        return result
+
+    with open(metrics_file, 'r', encoding='utf-8') as f:
+        stages = parse_prometheus(f.read())
+    frame = stages.get('frame', {})
+    result['frames'] = frame.get('count', 0)
+    result['fps'] = frame['count'] / frame['sum'] if frame.get('sum') else 0.0
+    result['peak_rss_mb'] = usage.ru_maxrss / 1024  # kilobytes on Linux
+    result['stages_ms'] = {}
+    for stage, s in stages.items():
+        count = s.get('count', 0)
+        result['stages_ms'][stage] = {'count': count, 'mean': s.get('sum', 0.0) / count * 1000 if count else 0.0,
+                                      'p50': s.get('p50', 0.0) * 1000, 'p95': s.get('p95', 0.0) * 1000,
+                                      'p99': s.get('p99', 0.0) * 1000}
+    return result
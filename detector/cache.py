@@ -0,0 +1,95 @@
+import os
+import hashlib
+import sqlite3
+
+import numpy as np
+
+from detector.postprocess import Detections
+
+CACHE_KEY_MODES = ['stat', 'content']
+
+
+def file_hash(path):
+    """SHA-256 of a file, or of all files of a folder (OpenVINO models are folders)."""
+    digest = hashlib.sha256()
+    paths = [path] if os.path.isfile(path) else sorted(
+        os.path.join(root, f) for root, _, files in os.walk(path) for f in files)
+    for p in paths:
+        with open(p, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+
+class DetectionCache:
+    """On-disk SQLite cache of per-image detections for repeated folder scans.
+
+    Images are keyed either by path, modification time and size ('stat', no file read)
+    or by a SHA-256 of their bytes ('content', survives renames and copies). Entries are
+    stored under a settings string (imgsz, threshold and anything else that changes the
+    output), and the whole cache is cleared when the model file's hash changes.
+    """
+
+    def __init__(self, db_path, model_path, settings, key_mode='stat', commit_every=100):
+        self.key_mode = key_mode
+        self.settings = settings
+        self.commit_every = commit_every
+        self.uncommitted = 0
+        self.keys = {}
+        self.hits = 0
+        self.misses = 0
+
+        self.conn = sqlite3.connect(db_path)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT)')
+        self.conn.execute('CREATE TABLE IF NOT EXISTS detections ('
+                          'image_key TEXT, settings TEXT, xyxy BLOB, conf BLOB, cls BLOB, '
+                          'PRIMARY KEY (image_key, settings))')
+
+        # Results of a different model are useless, drop them all when the model changes
+        model_hash = file_hash(model_path)
+        row = self.conn.execute("SELECT value FROM meta WHERE name = 'model_hash'").fetchone()
+        if row is None or row[0] != model_hash:
+            if row is not None:
+                print('Model changed since the detection cache was written, clearing the cache.')
+            self.conn.execute('DELETE FROM detections')
+            self.conn.execute("INSERT OR REPLACE INTO meta VALUES ('model_hash', ?)", (model_hash,))
+        self.conn.commit()
+
+    def image_key(self, path):
+        if self.key_mode == 'content':
+            return file_hash(path)
+        st = os.stat(path)
+        return f'{os.path.abspath(path)}|{st.st_mtime_ns}|{st.st_size}'
+
+    def lookup(self, path):
+        """Return the cached Detections of an image, or None if it has to be inferred."""
+        key = self.image_key(path)
+        row = self.conn.execute('SELECT xyxy, conf, cls FROM detections WHERE image_key = ? AND settings = ?',
+                                (key, self.settings)).fetchone()
+        if row is None:
+            self.keys[path] = key
+            self.misses = self.misses + 1
+            return None
+        self.hits = self.hits + 1
+        xyxy, conf, cls = row
+        return Detections(np.frombuffer(xyxy, dtype=np.float32).reshape(-1, 4).copy(),
+                          np.frombuffer(conf, dtype=np.float32).copy(),
+                          np.frombuffer(cls, dtype=np.int32).astype(int))
+
+    def store(self, path, detections):
+        """Save the detections of an image that missed the cache."""
+        key = self.keys.pop(path, None) or self.image_key(path)
+        self.conn.execute('INSERT OR REPLACE INTO detections VALUES (?, ?, ?, ?, ?)',
+                          (key, self.settings,
+                           detections.xyxy.astype(np.float32).tobytes(),
+                           detections.conf.astype(np.float32).tobytes(),
+                           detections.cls.astype(np.int32).tobytes()))
+        self.uncommitted = self.uncommitted + 1
+        if self.uncommitted >= self.commit_every:
+            self.conn.commit()
+            self.uncommitted = 0
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
@@ -0,0 +1,139 @@
+import os
+import csv
+
+import cv2
+import numpy as np
+
+from detector.sources import img_ext_list
+
+# Confidence threshold used for mAP evaluation, same as Ultralytics' validator
+EVAL_CONF = 0.001
+
+
+def list_images(folder):
+    """All images in a folder and its subfolders, sorted for reproducible runs."""
+    images = []
+    for root, _, files in os.walk(folder):
+        for file in files:
+            if os.path.splitext(file)[1] in img_ext_list:
+                images.append(os.path.join(root, file))
+    return sorted(images)
+
+
+def label_path(img_path):
+    """YOLO label file for an image: images/x.jpg -> labels/x.txt, or x.txt next to the image."""
+    stem = os.path.splitext(img_path)[0]
+    parts = stem.split(os.sep)
+    if 'images' in parts:
+        idx = len(parts) - 1 - parts[::-1].index('images')
+        parts[idx] = 'labels'
+        return os.sep.join(parts) + '.txt'
+    return stem + '.txt'
+
+
+def load_labels(img_path, img_w, img_h):
+    """Ground truth boxes of an image as (classes, xyxy) arrays in pixels."""
+    path = label_path(img_path)
+    if not os.path.exists(path):
+        return np.zeros(0, dtype=int), np.zeros((0, 4), dtype=np.float32)
+    rows = np.loadtxt(path, ndmin=2, dtype=np.float32)
+    if rows.size == 0:
+        return np.zeros(0, dtype=int), np.zeros((0, 4), dtype=np.float32)
+    cls = rows[:, 0].astype(int)
+    cx, cy, w, h = rows[:, 1] * img_w, rows[:, 2] * img_h, rows[:, 3] * img_w, rows[:, 4] * img_h
+    xyxy = np.stack([cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2], axis=1)
+    return cls, xyxy
+
+
+def box_iou(a, b):
+    """Pairwise IoU between (N, 4) and (M, 4) xyxy arrays."""
+    lt = np.maximum(a[:, None, :2], b[None, :, :2])
+    rb = np.minimum(a[:, None, 2:], b[None, :, 2:])
+    inter = (rb - lt).clip(0).prod(axis=2)
+    area_a = (a[:, 2:] - a[:, :2]).prod(axis=1)
+    area_b = (b[:, 2:] - b[:, :2]).prod(axis=1)
+    return inter / (area_a[:, None] + area_b[None, :] - inter + 1e-7)
+
+
+def match_predictions(detections, gt_cls, gt_xyxy, iou_thresh=0.5):
+    """Mark each prediction as a true positive if it matches an unmatched ground truth box of its class."""
+    tp = np.zeros(len(detections), dtype=bool)
+    if len(detections) == 0 or len(gt_cls) == 0:
+        return tp
+    iou = box_iou(detections.xyxy, gt_xyxy)
+    iou[detections.cls[:, None] != gt_cls[None, :]] = 0
+    matched_gt = np.zeros(len(gt_cls), dtype=bool)
+    for i in np.argsort(-detections.conf):
+        candidates = np.where((iou[i] >= iou_thresh) & ~matched_gt)[0]
+        if len(candidates):
+            j = candidates[np.argmax(iou[i, candidates])]
+            matched_gt[j] = True
+            tp[i] = True
+    return tp
+
+
+def average_precision(tp, conf, num_gt):
+    """101-point interpolated AP, as computed by Ultralytics and COCO."""
+    if num_gt == 0:
+        return None
+    if len(tp) == 0:
+        return 0.0
+    order = np.argsort(-conf)
+    tp = tp[order]
+    tpc = np.cumsum(tp)
+    fpc = np.cumsum(~tp)
+    recall = tpc / num_gt
+    precision = tpc / (tpc + fpc)
+
+    # Precision envelope
+    mpre = np.concatenate(([1.0], precision, [0.0]))
+    mrec = np.concatenate(([0.0], recall, [1.0]))
+    mpre = np.flip(np.maximum.accumulate(np.flip(mpre)))
+    x = np.linspace(0, 1, 101)
+    trapezoid = np.trapezoid if hasattr(np, 'trapezoid') else np.trapz  # np.trapz was renamed in NumPy 2.0
+    return float(trapezoid(np.interp(x, mrec, mpre), x))
+
+
+def evaluate_map50(backend, images, batch_size=1):
+    """Run a backend over labelled images and return (mAP50, per-class AP50 dict)."""
+    all_tp, all_conf, all_cls = [], [], []
+    gt_counts = {}
+    for start in range(0, len(images), batch_size):
+        paths, frames = [], []
+        for path in images[start:start + batch_size]:
+            frame = cv2.imread(path)
+            if frame is None:
+                print(f'Unable to read image {path}, skipping it.')
+                continue
+            paths.append(path)
+            frames.append(frame)
+        if not frames:
+            continue
+        for path, frame, detections in zip(paths, frames, backend.predict(frames, EVAL_CONF)):
+            gt_cls, gt_xyxy = load_labels(path, frame.shape[1], frame.shape[0])
+            for c in gt_cls.tolist():
+                gt_counts[c] = gt_counts.get(c, 0) + 1
+            all_tp.append(match_predictions(detections, gt_cls, gt_xyxy))
+            all_conf.append(detections.conf)
+            all_cls.append(detections.cls)
+
+    tp = np.concatenate(all_tp) if all_tp else np.zeros(0, dtype=bool)
+    conf = np.concatenate(all_conf) if all_conf else np.zeros(0)
+    cls = np.concatenate(all_cls) if all_cls else np.zeros(0, dtype=int)
+
+    per_class = {}
+    for c, num_gt in sorted(gt_counts.items()):
+        mask = cls == c
+        per_class[backend.names[c]] = average_precision(tp[mask], conf[mask], num_gt)
+    map50 = float(np.mean(list(per_class.values()))) if per_class else 0.0
+    return map50, per_class
+
+
+def baseline_from_results(results_csv='train/results.csv'):
+    """Metrics of the epoch Ultralytics saved as best.pt (highest 0.1*mAP50 + 0.9*mAP50-95)."""
+    with open(results_csv, 'r', encoding='utf-8') as f:
+        rows = [{k.strip(): v.strip() for k, v in row.items()} for row in csv.DictReader(f)]
+    best = max(rows, key=lambda r: 0.1 * float(r['metrics/mAP50(B)']) + 0.9 * float(r['metrics/mAP50-95(B)']))
+    return {'epoch': int(best['epoch']),
+            'mAP50': float(best['metrics/mAP50(B)']),
+            'mAP50-95': float(best['metrics/mAP50-95(B)'])}
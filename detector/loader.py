@@ -0,0 +1,87 @@
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import cv2
+
+
+def iter_image_files(folder, extensions, recursive=False):
+    """Yield image paths in a folder lazily, directory by directory, in sorted order.
+
+    Only one directory listing is held in memory at a time, so scans of very large
+    archives start producing paths immediately.
+    """
+    with os.scandir(folder) as it:
+        entries = sorted(it, key=lambda e: e.name)
+    subdirs = []
+    for entry in entries:
+        if entry.is_file() and os.path.splitext(entry.name)[1] in extensions:
+            yield entry.path
+        elif recursive and entry.is_dir():
+            subdirs.append(entry.path)
+    for subdir in subdirs:
+        yield from iter_image_files(subdir, extensions, recursive)
+
+
+def load_image(path, resize_to=None):
+    """Decode an image, optionally resizing it. Top-level so it can run in a process pool."""
+    frame = cv2.imread(path)
+    if frame is not None and resize_to is not None and (frame.shape[1], frame.shape[0]) != tuple(resize_to):
+        frame = cv2.resize(frame, tuple(resize_to))
+    return frame
+
+
+class PrefetchLoader:
+    """Decode images on a worker pool while the caller runs inference on earlier ones.
+
+    Up to `prefetch` images are in flight at any time and are returned in the order of
+    `paths`. Threads work well because OpenCV releases the GIL while decoding; a process
+    pool can be used instead when decode-side Python work dominates.
+
+    If `lookup(path)` is given and returns a cached result for a path, that image is not
+    decoded at all and the cached result is returned in its place.
+    """
+
+    def __init__(self, paths, prefetch=8, workers=4, resize_to=None, use_processes=False, lookup=None):
+        self.paths = iter(paths)
+        self.prefetch = max(1, prefetch)
+        self.resize_to = resize_to
+        self.lookup = lookup
+        pool_class = ProcessPoolExecutor if use_processes else ThreadPoolExecutor
+        self.executor = pool_class(max_workers=workers)
+        self.pending = deque()
+        self._fill()
+
+    def _fill(self):
+        while len(self.pending) < self.prefetch:
+            path = next(self.paths, None)
+            if path is None:
+                return
+            cached = self.lookup(path) if self.lookup is not None else None
+            if cached is not None:
+                self.pending.append((path, None, cached))
+            else:
+                self.pending.append((path, self.executor.submit(load_image, path, self.resize_to), None))
+
+    def next(self):
+        """Return (path, frame, cached) of the next image, or None when all images are done.
+
+        Exactly one of frame and cached is set.
+        """
+        while self.pending:
+            path, future, cached = self.pending.popleft()
+            self._fill()
+            if cached is not None:
+                return path, None, cached
+            frame = future.result()
+            if frame is None:
+                print(f'Unable to read image {path}, skipping it.')
+                continue
+            return path, frame, None
+        return None
+
+    def close(self):
+        for _, future, _ in self.pending:
+            if future is not None:
+                future.cancel()
+        self.executor.shutdown(wait=False)
@@ -0,0 +1,200 @@
+import os
+import time
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+# Order in which stages are reported
+STAGES = ['decode', 'resize', 'preprocess', 'inference', 'postprocess', 'track', 'draw', 'display', 'record', 'write', 'frame']
+QUANTILES = [0.5, 0.95, 0.99]
+# Order in which one-time startup phases are reported
+STARTUP_PHASES = ['imports', 'model_load', 'warmup', 'first_detection']
+
+
+class RingBuffer:
+    """Fixed-size window of the most recent samples with O(1) insertion and running mean.
+
+    Lifetime count and sum are kept separately, for Prometheus summary _count/_sum.
+    """
+
+    def __init__(self, size=200):
+        self.values = np.zeros(size, dtype=np.float64)
+        self.size = size
+        self.index = 0
+        self.count = 0
+        self.window_sum = 0.0
+        self.total_count = 0
+        self.total_sum = 0.0
+        self.lock = threading.Lock()
+
+    def append(self, value):
+        with self.lock:
+            if self.count == self.size:
+                self.window_sum -= self.values[self.index]
+            else:
+                self.count += 1
+            self.values[self.index] = value
+            self.window_sum += value
+            self.index = (self.index + 1) % self.size
+            self.total_count += 1
+            self.total_sum += value
+
+    def mean(self):
+        return self.window_sum / self.count if self.count else 0.0
+
+    def percentiles(self, quantiles=QUANTILES):
+        """Quantiles of the samples currently in the window (sorted only when asked, not per sample)."""
+        if not self.count:
+            return [0.0 for _ in quantiles]
+        with self.lock:
+            window = self.values[:self.count].copy()
+        return np.quantile(window, quantiles).tolist()
+
+
+class StageMetrics:
+    """Per-stage latency ring buffers for the detection pipeline, plus one-time startup phase times."""
+
+    def __init__(self, window=200):
+        self.window = window
+        self.buffers = {}
+        self.startup = {}
+        self.lock = threading.Lock()
+
+    def buffer(self, stage):
+        buf = self.buffers.get(stage)
+        if buf is None:
+            with self.lock:
+                buf = self.buffers.setdefault(stage, RingBuffer(self.window))
+        return buf
+
+    def record(self, stage, seconds):
+        self.buffer(stage).append(seconds)
+
+    def mark(self, phase, seconds):
+        """Record the duration of a one-time startup phase, e.g. seconds from process start to first detection."""
+        self.startup[phase] = seconds
+
+    @contextmanager
+    def time(self, stage):
+        """Time the body of a with-block as one sample of stage."""
+        t_start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - t_start)
+
+    def fps(self):
+        """Frames per second from the mean time per frame over the recent window."""
+        mean = self.buffer('frame').mean()
+        return 1 / mean if mean else 0.0
+
+    def _ordered_stages(self):
+        # record() may add a stage from another thread while the report iterates
+        with self.lock:
+            stages = list(self.buffers)
+        known = [s for s in STAGES if s in stages]
+        return known + sorted(s for s in stages if s not in STAGES)
+
+    def _ordered_phases(self):
+        known = [p for p in STARTUP_PHASES if p in self.startup]
+        return known + sorted(p for p in self.startup if p not in STARTUP_PHASES)
+
+    def summary(self):
+        """{stage: {count, mean, p50, p95, p99}} with times in milliseconds."""
+        result = {}
+        for stage in self._ordered_stages():
+            buf = self.buffers[stage]
+            p50, p95, p99 = buf.percentiles()
+            result[stage] = {'count': buf.total_count, 'mean': buf.mean() * 1000,
+                             'p50': p50 * 1000, 'p95': p95 * 1000, 'p99': p99 * 1000}
+        return result
+
+    def prometheus_text(self, labels=None):
+        """Render the metrics in the Prometheus text exposition format."""
+        extra = ''.join(f',{k}="{v}"' for k, v in (labels or {}).items())
+        lines = ['# HELP firewatch_stage_seconds Time spent in each stage of the detection pipeline.',
+                 '# TYPE firewatch_stage_seconds summary']
+        for stage in self._ordered_stages():
+            buf = self.buffers[stage]
+            for q, value in zip(QUANTILES, buf.percentiles()):
+                lines.append(f'firewatch_stage_seconds{{stage="{stage}",quantile="{q}"{extra}}} {value:.6f}')
+            lines.append(f'firewatch_stage_seconds_sum{{stage="{stage}"{extra}}} {buf.total_sum:.6f}')
+            lines.append(f'firewatch_stage_seconds_count{{stage="{stage}"{extra}}} {buf.total_count}')
+        lines.append('# HELP firewatch_fps Frames per second over the recent window.')
+        lines.append('# TYPE firewatch_fps gauge')
+        fps_labels = '{' + extra.lstrip(',') + '}' if extra else ''
+        lines.append(f'firewatch_fps{fps_labels} {self.fps():.3f}')
+        if self.startup:
+            lines.append('# HELP firewatch_startup_seconds Duration of each one-time startup phase.')
+            lines.append('# TYPE firewatch_startup_seconds gauge')
+            for phase in self._ordered_phases():
+                lines.append(f'firewatch_startup_seconds{{phase="{phase}"{extra}}} {self.startup[phase]:.6f}')
+        return '\n'.join(lines) + '\n'
+
+    def print_summary(self):
+        print(f'{"Stage":<12} {"count":>8} {"mean ms":>9} {"p50 ms":>9} {"p95 ms":>9} {"p99 ms":>9}')
+        for stage, s in self.summary().items():
+            print(f'{stage:<12} {s["count"]:>8} {s["mean"]:>9.2f} {s["p50"]:>9.2f} {s["p95"]:>9.2f} {s["p99"]:>9.2f}')
+        if self.startup:
+            print('Startup: ' + ', '.join(f'{phase} {self.startup[phase]*1000:.0f} ms' for phase in self._ordered_phases()))
+
+
+class MetricsExporter:
+    """Publishes StageMetrics as Prometheus text, to a file rewritten every interval seconds and/or over HTTP at /metrics."""
+
+    def __init__(self, metrics, path=None, port=None, interval=10.0, labels=None):
+        self.metrics = metrics
+        self.path = path
+        self.port = port
+        self.interval = interval
+        self.labels = labels
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.server = None
+
+    def write_file(self):
+        # Write to a temporary file and rename, so a scraper never reads a half-written file
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(self.metrics.prometheus_text(self.labels))
+        os.replace(tmp_path, self.path)
+
+    def _file_loop(self):
+        while not self.stop_event.wait(self.interval):
+            self.write_file()
+
+    def start(self):
+        if self.path:
+            self.thread = threading.Thread(target=self._file_loop, daemon=True)
+            self.thread.start()
+        if self.port:
+            exporter = self
+
+            class Handler(BaseHTTPRequestHandler):
+                def do_GET(self):
+                    if self.path != '/metrics':
+                        self.send_error(404)
+                        return
+                    body = exporter.metrics.prometheus_text(exporter.labels).encode('utf-8')
+                    self.send_response(200)
+                    self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                    self.send_header('Content-Length', str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+
+                def log_message(self, format, *args):
+                    pass
+
+            self.server = ThreadingHTTPServer(('127.0.0.1', self.port), Handler)
+            threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+        if self.path:
+            self.write_file()
+        if self.server is not None:
+            self.server.shutdown()
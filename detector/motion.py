@@ -0,0 +1,51 @@
+import cv2
+import numpy as np
+
+
+class MotionGate:
+    """Decides whether a frame changed enough since the last inference to be worth running the detector.
+
+    Frames are compared on a small blurred grayscale copy. A pixel counts as changed
+    when its intensity moved by more than pixel_thresh, and the detector runs when the
+    fraction of changed pixels exceeds change_thresh or when max_skip frames in a row
+    were skipped. The reference is the last frame the detector actually ran on, so
+    slow changes such as a thin plume building up still accumulate and open the gate.
+    """
+
+    def __init__(self, change_thresh=0.005, max_skip=30, pixel_thresh=25, width=160):
+        self.change_thresh = change_thresh
+        self.max_skip = max_skip
+        self.pixel_thresh = pixel_thresh
+        self.width = width
+        self.reference = None
+        self.skipped_in_row = 0
+        self.frames_seen = 0
+        self.frames_skipped = 0
+
+    def _small_gray(self, frame):
+        h, w = frame.shape[:2]
+        small = cv2.resize(frame, (self.width, max(1, round(h * self.width / w))), interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY) if small.ndim == 3 else small
+        return cv2.GaussianBlur(gray, (5, 5), 0)
+
+    def should_infer(self, frame):
+        """Return True if the detector should run on this frame, False to reuse the last detections."""
+        self.frames_seen = self.frames_seen + 1
+        gray = self._small_gray(frame)
+
+        if self.reference is not None and self.skipped_in_row < self.max_skip:
+            changed = np.count_nonzero(cv2.absdiff(gray, self.reference) > self.pixel_thresh)
+            if changed < self.change_thresh * gray.size:
+                self.skipped_in_row = self.skipped_in_row + 1
+                self.frames_skipped = self.frames_skipped + 1
+                return False
+
+        self.reference = gray
+        self.skipped_in_row = 0
+        return True
+
+    @property
+    def skip_ratio(self):
+        if self.frames_seen == 0:
+            return 0.0
+        return self.frames_skipped / self.frames_seen
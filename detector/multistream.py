@@ -0,0 +1,89 @@
+import threading
+import time
+from collections import deque
+
+import cv2
+
+from detector.pipeline import FrameQueue, END_OF_STREAM
+from detector.postprocess import Detections
+
+
+class CameraStream:
+    """One source of a multi-camera run: a capture thread feeding a bounded queue, plus per-stream state.
+
+    Live sources keep only the freshest frames (drop-oldest), video files keep every
+    frame. The stream also tracks its own frame rate, last detections and motion gate,
+    so several cameras can share a single loaded model.
+    """
+
+    def __init__(self, name, source, resize_to=None, gate=None, queue_size=2, fps_avg_len=200, metrics=None):
+        self.name = name
+        self.source = source
+        self.resize_to = resize_to
+        self.metrics = metrics
+        self.gate = gate
+        self.stop_event = threading.Event()
+        self.queue = FrameQueue(queue_size, source.live, self.stop_event)
+        self.thread = threading.Thread(target=self._capture_loop, daemon=True)
+        self.finished = False
+        self.last_detections = Detections.empty()
+        self.frames_processed = 0
+        self.frame_times = deque(maxlen=fps_avg_len)
+
+    def _capture_loop(self):
+        frame_index = 0
+        try:
+            while not self.stop_event.is_set():
+                frame = self.source.read()
+                if frame is None:
+                    break
+                if self.resize_to:
+                    t_start = time.perf_counter()
+                    frame = cv2.resize(frame, self.resize_to)
+                    if self.metrics is not None:
+                        self.metrics.record('resize', time.perf_counter() - t_start)
+                frame_index = frame_index + 1
+                if not self.queue.put((frame_index, time.perf_counter(), frame)):
+                    break
+        finally:
+            self.queue.put(END_OF_STREAM)
+
+    def start(self):
+        self.thread.start()
+
+    def poll(self):
+        """Return the next (frame_index, t_capture, frame) if one is ready, otherwise None."""
+        if self.finished:
+            return None
+        item = self.queue.get_nowait()
+        if item is END_OF_STREAM:
+            self.finished = True
+            return None
+        return item
+
+    def mark_processed(self):
+        """Record that a frame of this stream went through the detector (or the gate)."""
+        self.frames_processed = self.frames_processed + 1
+        self.frame_times.append(time.perf_counter())
+
+    @property
+    def fps(self):
+        """Frames per second processed for this stream over the recent window."""
+        if len(self.frame_times) < 2:
+            return 0.0
+        return (len(self.frame_times) - 1) / (self.frame_times[-1] - self.frame_times[0])
+
+    def stop(self):
+        self.stop_event.set()
+        self.thread.join()
+        self.source.release()
+
+
+def collect_ready(streams):
+    """Gather the next ready frame of every stream, one per stream, in stream order."""
+    ready = []
+    for stream in streams:
+        item = stream.poll()
+        if item is not None:
+            ready.append((stream, item))
+    return ready
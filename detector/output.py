@@ -0,0 +1,49 @@
+import sys
+import csv
+import json
+
+CSV_FIELDS = ['frame', 'timestamp', 'source', 'class', 'confidence', 'xmin', 'ymin', 'xmax', 'ymax']
+
+
+class DetectionWriter:
+    """Stream detections as JSON Lines or CSV, one record per detected object.
+
+    Each record holds the frame index, a Unix timestamp, the source the frame came
+    from (image filename or video/camera source), the class name, the confidence
+    and the box corners in pixels. Output is flushed after every frame so that a
+    process reading the stream sees detections as they happen.
+    """
+
+    def __init__(self, path='-', fmt='jsonl', stream=None):
+        if fmt not in ('jsonl', 'csv'):
+            raise ValueError(f'Output format {fmt} is not supported.')
+        self.fmt = fmt
+        if path == '-':
+            self.f = stream if stream is not None else sys.stdout
+            self.owns_file = False
+        else:
+            self.f = open(path, 'w', newline='', encoding='utf-8')
+            self.owns_file = True
+
+        if fmt == 'csv':
+            self.csv_writer = csv.writer(self.f)
+            self.csv_writer.writerow(CSV_FIELDS)
+
+    def write(self, frame_index, timestamp, source, detections):
+        """Write the detections of one frame. detections is a list of (classname, conf, (xmin, ymin, xmax, ymax))."""
+        for classname, conf, xyxy in detections:
+            xmin, ymin, xmax, ymax = (int(v) for v in xyxy)
+            if self.fmt == 'csv':
+                self.csv_writer.writerow([frame_index, f'{timestamp:.3f}', source, classname, f'{conf:.4f}',
+                                          xmin, ymin, xmax, ymax])
+            else:
+                record = {'frame': frame_index, 'timestamp': round(timestamp, 3), 'source': source,
+                          'class': classname, 'confidence': round(float(conf), 4), 'xyxy': [xmin, ymin, xmax, ymax]}
+                self.f.write(json.dumps(record, ensure_ascii=False) + '\n')
+        self.f.flush()
+
+    def close(self):
+        if self.owns_file:
+            self.f.close()
+        else:
+            self.f.flush()
@@ -0,0 +1,145 @@
+import queue
+import threading
+import time
+
+# Marker passed down the queues when the capture stage runs out of frames
+END_OF_STREAM = object()
+
+
+class FrameQueue:
+    """Bounded queue connecting two pipeline stages.
+
+    With drop_oldest=True (live cameras) a full queue discards its oldest item, so the
+    consumer always works on the freshest frame instead of a backlog. Otherwise put()
+    waits for room, so no frame of a video file is ever lost.
+    """
+
+    def __init__(self, maxsize, drop_oldest, stop_event):
+        self._q = queue.Queue(maxsize=maxsize)
+        self.drop_oldest = drop_oldest
+        self.stop_event = stop_event
+        self.dropped = 0
+
+    def put(self, item):
+        while not self.stop_event.is_set():
+            try:
+                if self.drop_oldest:
+                    self._q.put_nowait(item)
+                else:
+                    self._q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                if self.drop_oldest:
+                    try:
+                        self._q.get_nowait()
+                        self.dropped = self.dropped + 1
+                    except queue.Empty:
+                        pass
+        return False
+
+    def get(self):
+        while not self.stop_event.is_set():
+            try:
+                return self._q.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        return END_OF_STREAM
+
+    def get_nowait(self):
+        """Return the next item, or None if the queue is empty right now."""
+        try:
+            return self._q.get_nowait()
+        except queue.Empty:
+            return None
+
+
+class StagedPipeline:
+    """Capture -> inference -> render pipeline running each stage on its own thread.
+
+    capture_fn() returns the next frame or None when the source is exhausted.
+    infer_fn(frame) returns the inference result for a frame.
+    render_fn(frame_index, t_capture, frame, result) draws/displays/records/writes a
+    frame and returns False to stop the pipeline. frame_index counts captured frames
+    from 1, so gaps show where a live source dropped frames.
+
+    Capture and inference run on worker threads; the render stage runs on the calling
+    thread because OpenCV's HighGUI (imshow/waitKey) must stay on the main thread.
+    """
+
+    def __init__(self, capture_fn, infer_fn, render_fn, live, queue_size=2):
+        self.capture_fn = capture_fn
+        self.infer_fn = infer_fn
+        self.render_fn = render_fn
+        self.stop_event = threading.Event()
+        self.capture_queue = FrameQueue(queue_size, live, self.stop_event)
+        self.result_queue = FrameQueue(queue_size, live, self.stop_event)
+        self.frames_rendered = 0
+        self.latency_total = 0.0
+        self.error = None
+
+    def _capture_loop(self):
+        frame_index = 0
+        try:
+            while not self.stop_event.is_set():
+                frame = self.capture_fn()
+                if frame is None:
+                    break
+                frame_index = frame_index + 1
+                if not self.capture_queue.put((frame_index, time.perf_counter(), frame)):
+                    break
+        except Exception as e:
+            self.error = e
+        finally:
+            self.capture_queue.put(END_OF_STREAM)
+
+    def _inference_loop(self):
+        try:
+            while True:
+                item = self.capture_queue.get()
+                if item is END_OF_STREAM:
+                    break
+                frame_index, t_capture, frame = item
+                result = self.infer_fn(frame)
+                if not self.result_queue.put((frame_index, t_capture, frame, result)):
+                    break
+        except Exception as e:
+            self.error = e
+        finally:
+            self.result_queue.put(END_OF_STREAM)
+
+    def run(self):
+        """Run the pipeline until the source ends or render_fn asks to stop."""
+        threads = [threading.Thread(target=self._capture_loop, daemon=True),
+                   threading.Thread(target=self._inference_loop, daemon=True)]
+        for t in threads:
+            t.start()
+
+        try:
+            while True:
+                item = self.result_queue.get()
+                if item is END_OF_STREAM:
+                    break
+                frame_index, t_capture, frame, result = item
+                keep_going = self.render_fn(frame_index, t_capture, frame, result)
+                self.frames_rendered = self.frames_rendered + 1
+                self.latency_total = self.latency_total + (time.perf_counter() - t_capture)
+                if keep_going is False:
+                    break
+        finally:
+            self.stop_event.set()
+            for t in threads:
+                t.join()
+
+        if self.error is not None:
+            raise self.error
+
+    @property
+    def frames_dropped(self):
+        return self.capture_queue.dropped + self.result_queue.dropped
+
+    @property
+    def avg_latency(self):
+        """Average time from frame capture to the end of the render stage, in seconds."""
+        if self.frames_rendered == 0:
+            return 0.0
+        return self.latency_total / self.frames_rendered
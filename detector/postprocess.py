@@ -0,0 +1,109 @@
+import numpy as np
+
+# Per-class coordinate offset for batched NMS, larger than any box side it will see
+MAX_WH = 7680
+
+
+class Detections:
+    """Detections of one frame held as parallel NumPy arrays.
+
+    xyxy is an (N, 4) float32 array of box corners in pixels, conf an (N,) float32
+    array of confidences and cls an (N,) int array of class indices.
+    """
+
+    def __init__(self, xyxy, conf, cls):
+        self.xyxy = xyxy
+        self.conf = conf
+        self.cls = cls
+
+    def __len__(self):
+        return len(self.conf)
+
+    @classmethod
+    def empty(cls):
+        return cls(np.zeros((0, 4), dtype=np.float32), np.zeros(0, dtype=np.float32), np.zeros(0, dtype=int))
+
+    @classmethod
+    def concatenate(cls, detections_list):
+        """Join the detections of several frames or tiles into one Detections."""
+        if not detections_list:
+            return cls.empty()
+        return cls(np.concatenate([d.xyxy for d in detections_list]),
+                   np.concatenate([d.conf for d in detections_list]),
+                   np.concatenate([d.cls for d in detections_list]))
+
+    def offset(self, dx, dy):
+        """Return the detections shifted by (dx, dy) pixels, e.g. from crop to frame coordinates."""
+        return Detections(self.xyxy + np.array([dx, dy, dx, dy], dtype=np.float32), self.conf, self.cls)
+
+    def scale(self, sx, sy):
+        """Return the detections with box coordinates multiplied by (sx, sy), e.g. to a resized frame."""
+        return Detections(self.xyxy * np.array([sx, sy, sx, sy], dtype=np.float32), self.conf, self.cls)
+
+    def filter(self, mask):
+        """Return the detections selected by a boolean mask or index array."""
+        return Detections(self.xyxy[mask], self.conf[mask], self.cls[mask])
+
+    def names(self, label_names):
+        """Class names of all detections, looked up in an array built by label_array()."""
+        return label_names[self.cls]
+
+    def class_counts(self, num_classes):
+        """Number of detections per class index."""
+        return np.bincount(self.cls, minlength=num_classes)
+
+    def rows(self, label_names):
+        """Iterate over (classname, conf, xyxy) for each detection."""
+        return zip(self.names(label_names).tolist(), self.conf.tolist(), self.xyxy.astype(int).tolist())
+
+
+def label_array(labels):
+    """Turn the model's {index: name} labelmap into a NumPy array indexable by class index."""
+    return np.array([labels[i] for i in range(len(labels))], dtype=object)
+
+
+def extract_detections(boxes, min_thresh):
+    """Convert an Ultralytics Boxes object into Detections with confidence >= min_thresh.
+
+    The coordinates, confidences and classes are moved to the CPU once per frame as
+    whole arrays, and the threshold is applied with a single vectorized mask.
+    """
+    if len(boxes) == 0:
+        return Detections.empty()
+    xyxy = boxes.xyxy.cpu().numpy()
+    conf = boxes.conf.cpu().numpy()
+    cls = boxes.cls.cpu().numpy().astype(int)
+    keep = conf >= min_thresh
+    return Detections(xyxy[keep], conf[keep], cls[keep])
+
+
+def nms(xyxy, conf, iou_thresh):
+    """Greedy non-maximum suppression. Returns the indices of the boxes to keep, highest confidence first.
+
+    IoU of the current best box against all remaining boxes is computed in one
+    vectorized step per kept box.
+    """
+    x1, y1, x2, y2 = xyxy[:, 0], xyxy[:, 1], xyxy[:, 2], xyxy[:, 3]
+    areas = (x2 - x1).clip(0) * (y2 - y1).clip(0)
+    order = conf.argsort()[::-1]
+    keep = []
+    while order.size > 0:
+        i = order[0]
+        keep.append(i)
+        rest = order[1:]
+        w = (np.minimum(x2[i], x2[rest]) - np.maximum(x1[i], x1[rest])).clip(0)
+        h = (np.minimum(y2[i], y2[rest]) - np.maximum(y1[i], y1[rest])).clip(0)
+        inter = w * h
+        iou = inter / (areas[i] + areas[rest] - inter + 1e-7)
+        order = rest[iou <= iou_thresh]
+    return np.array(keep, dtype=int)
+
+
+def batched_nms(detections, iou_thresh):
+    """Class-aware NMS: boxes of different classes never suppress each other."""
+    if len(detections) == 0:
+        return detections
+    # Shift each class into its own coordinate range so a single NMS pass handles all classes
+    offsets = detections.cls[:, None].astype(np.float32) * MAX_WH
+    keep = nms(detections.xyxy + offsets, detections.conf, iou_thresh)
+    return detections.filter(keep)
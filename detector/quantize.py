@@ -0,0 +1,93 @@
+import os
+import re
+import shutil
+
+import cv2
+
+from detector.backends import ExportedBackend, export_model
+
+
+def calibration_batches(images, imgsz):
+    """Yield preprocessed (1, 3, imgsz, imgsz) blobs of calibration images, letterboxed exactly like at inference time."""
+    preprocessor = ExportedBackend(imgsz)
+    preprocessor.fixed_shape = (imgsz, imgsz)
+    for path in images:
+        frame = cv2.imread(path)
+        if frame is None:
+            continue
+        blob, _, _ = preprocessor.preprocess([frame])
+        yield blob
+
+
+def head_node_names(onnx_model):
+    """Names of the nodes in the last module of the network (the Detect head).
+
+    The head decodes boxes and applies the class sigmoid; quantizing it costs a lot of
+    box precision and saves very little time, so it is kept in FP32.
+    """
+    module_ids = [int(m.group(1)) for node in onnx_model.graph.node
+                  for m in [re.match(r'/model\.(\d+)/', node.name)] if m]
+    if not module_ids:
+        return []
+    head = f'/model.{max(module_ids)}/'
+    return [node.name for node in onnx_model.graph.node if node.name.startswith(head)]
+
+
+def quantize_onnx(model_path, images, imgsz=480, output_path=None):
+    """Statically quantize the model to INT8 (QDQ format) using onnxruntime, calibrated on images."""
+    import onnx
+    from onnxruntime.quantization import (CalibrationDataReader, CalibrationMethod, QuantFormat, QuantType,
+                                          quantize_static)
+
+    fp32_path = export_model(model_path, 'onnx', imgsz, dynamic=False) if model_path.endswith('.pt') else model_path
+    if output_path is None:
+        output_path = os.path.splitext(fp32_path)[0] + '_int8.onnx'
+
+    fp32_model = onnx.load(fp32_path)
+    input_name = fp32_model.graph.input[0].name
+
+    class ImageReader(CalibrationDataReader):
+        def __init__(self):
+            self.batches = calibration_batches(images, imgsz)
+
+        def get_next(self):
+            blob = next(self.batches, None)
+            return None if blob is None else {input_name: blob}
+
+    quantize_static(fp32_path, output_path, ImageReader(),
+                    quant_format=QuantFormat.QDQ,
+                    activation_type=QuantType.QUInt8,
+                    weight_type=QuantType.QInt8,
+                    per_channel=True,
+                    calibrate_method=CalibrationMethod.MinMax,
+                    nodes_to_exclude=head_node_names(fp32_model))
+
+    # Carry over the Ultralytics metadata (labelmap, imgsz, stride) so the INT8 model loads like the FP32 one
+    int8_model = onnx.load(output_path)
+    del int8_model.metadata_props[:]
+    int8_model.metadata_props.extend(fp32_model.metadata_props)
+    onnx.save(int8_model, output_path)
+    return fp32_path, output_path
+
+
+def quantize_openvino(model_path, images, imgsz=480, output_dir=None):
+    """Quantize the OpenVINO IR to INT8 with NNCF post-training quantization, calibrated on images."""
+    import nncf
+    import openvino as ov
+
+    fp32_dir = export_model(model_path, 'openvino', imgsz, dynamic=False) if model_path.endswith('.pt') else model_path
+    if output_dir is None:
+        output_dir = fp32_dir.replace('_openvino_model', '_int8_openvino_model')
+
+    core = ov.Core()
+    xml_name = [f for f in os.listdir(fp32_dir) if f.endswith('.xml')][0]
+    ov_model = core.read_model(os.path.join(fp32_dir, xml_name))
+
+    calibration = nncf.Dataset(list(calibration_batches(images, imgsz)))
+    quantized = nncf.quantize(ov_model, calibration, preset=nncf.QuantizationPreset.MIXED,
+                              subset_size=len(images))
+
+    os.makedirs(output_dir, exist_ok=True)
+    ov.save_model(quantized, os.path.join(output_dir, xml_name))
+    shutil.copy(os.path.join(fp32_dir, 'metadata.yaml'), os.path.join(output_dir, 'metadata.yaml'))
+    return fp32_dir, output_dir
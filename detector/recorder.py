@@ -0,0 +1,167 @@
+import os
+import queue
+import threading
+import time
+from collections import deque
+
+import cv2
+
+
+class ClipWriter:
+    """Writes the frames of one clip to a video file as they arrive.
+
+    The file is opened once the frame rate is known: given up front (video files), or
+    measured over the timestamps of the clip's first second (cameras), so at most about
+    a second of compressed frames is held back.
+    """
+
+    def __init__(self, path, fps=None, fourcc='mp4v'):
+        self.path = path
+        self.fps = fps
+        self.fourcc = fourcc
+        self.writer = None
+        self.size = None
+        self.pending = []
+        self.frames = 0
+        self.first = None
+        self.last = None
+
+    def add(self, timestamp, jpg):
+        if self.first is None:
+            self.first = timestamp
+        self.last = timestamp
+        self.pending.append(jpg)
+        if self.writer is None and self.fps is None and timestamp - self.first < 1.0:
+            return
+        self._flush()
+
+    def _flush(self):
+        if not self.pending:
+            return
+        if self.writer is None:
+            if self.fps is None:
+                # Frame rate from the timestamps, so a clip captured at 7 FPS also plays back in real time
+                duration = self.last - self.first
+                self.fps = (len(self.pending) - 1) / duration if len(self.pending) > 1 and duration > 0 else 1.0
+            first = cv2.imdecode(self.pending[0], cv2.IMREAD_COLOR)
+            self.size = (first.shape[1], first.shape[0])
+            self.writer = cv2.VideoWriter(self.path, cv2.VideoWriter_fourcc(*self.fourcc), self.fps, self.size)
+        for jpg in self.pending:
+            frame = cv2.imdecode(jpg, cv2.IMREAD_COLOR)
+            if (frame.shape[1], frame.shape[0]) != self.size:
+                frame = cv2.resize(frame, self.size)
+            self.writer.write(frame)
+            self.frames = self.frames + 1
+        self.pending = []
+
+    def close(self):
+        self._flush()
+        if self.writer is not None:
+            self.writer.release()
+            print(f'Saved clip {self.path} ({self.frames} frames, {self.last - self.first:.1f} s at {self.fps:.1f} FPS)')
+
+
+class ClipRecorder:
+    """Event-triggered recording of short clips with pre- and post-event context.
+
+    Every frame is JPEG-compressed into a ring buffer holding the last pre_seconds of
+    video, capped at max_buffer_bytes. When a frame is marked as triggered, the buffer
+    becomes the start of a clip, which then keeps going until post_seconds have passed
+    without a trigger (or the clip reaches max_clip_seconds, in which case the next clip
+    continues right after it). Clip frames are handed to a background encoder thread as
+    they arrive, through a queue of at most max_queued_frames, so memory stays bounded
+    during long events as well; when the encoder falls behind, add() waits for it.
+
+    Timestamps are in seconds: capture times for cameras, positions in the video for
+    video files. Clips play back at fps if given, otherwise at the frame rate observed
+    from the timestamps.
+    """
+
+    def __init__(self, out_dir='clips', pre_seconds=5.0, post_seconds=10.0, max_buffer_bytes=64 << 20,
+                 max_clip_seconds=120.0, jpeg_quality=80, fourcc='mp4v', extension='.mp4', prefix='clip',
+                 fps=None, max_queued_frames=256):
+        self.out_dir = out_dir
+        self.pre_seconds = pre_seconds
+        self.post_seconds = post_seconds
+        self.max_buffer_bytes = max_buffer_bytes
+        self.max_clip_seconds = max_clip_seconds
+        self.jpeg_params = [cv2.IMWRITE_JPEG_QUALITY, jpeg_quality]
+        self.fourcc = fourcc
+        self.extension = extension
+        self.prefix = prefix
+        self.fps = fps
+
+        self.buffer = deque()
+        self.buffer_bytes = 0
+        self.recording = False
+        self.clip_start = None
+        self.post_deadline = None
+        self.clips_saved = 0
+
+        os.makedirs(out_dir, exist_ok=True)
+        self.jobs = queue.Queue(maxsize=max_queued_frames)
+        self.thread = threading.Thread(target=self._encode_loop, daemon=True)
+        self.thread.start()
+
+    def add(self, frame, timestamp, triggered):
+        """Add a frame captured at timestamp (seconds) and say whether it shows an event."""
+        ok, jpg = cv2.imencode('.jpg', frame, self.jpeg_params)
+        if not ok:
+            return
+
+        if not self.recording and triggered:
+            self._start_clip(timestamp)
+
+        if self.recording:
+            self.jobs.put(('frame', timestamp, jpg))
+            if triggered:
+                self.post_deadline = timestamp + self.post_seconds
+            if timestamp >= self.post_deadline:
+                self._finish_clip()
+            elif timestamp - self.clip_start >= self.max_clip_seconds:
+                self._finish_clip()
+                self._start_clip(timestamp)
+            return
+
+        self.buffer.append((timestamp, jpg))
+        self.buffer_bytes = self.buffer_bytes + len(jpg)
+        while self.buffer and (timestamp - self.buffer[0][0] > self.pre_seconds
+                               or self.buffer_bytes > self.max_buffer_bytes):
+            self.buffer_bytes = self.buffer_bytes - len(self.buffer.popleft()[1])
+
+    def _start_clip(self, timestamp):
+        # Start a clip with the buffered pre-event frames
+        name = f'{self.prefix}_{time.strftime("%Y%m%d_%H%M%S")}_{self.clips_saved:04d}{self.extension}'
+        self.jobs.put(('start', os.path.join(self.out_dir, name)))
+        self.clip_start = self.buffer[0][0] if self.buffer else timestamp
+        for item in self.buffer:
+            self.jobs.put(('frame',) + item)
+        self.buffer.clear()
+        self.buffer_bytes = 0
+        self.recording = True
+
+    def _finish_clip(self):
+        self.jobs.put(('end',))
+        self.clips_saved = self.clips_saved + 1
+        self.recording = False
+
+    def _encode_loop(self):
+        clip = None
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                return
+            if job[0] == 'start':
+                clip = ClipWriter(job[1], self.fps, self.fourcc)
+            elif job[0] == 'frame':
+                clip.add(job[1], job[2])
+            elif job[0] == 'end':
+                clip.close()
+                clip = None
+
+    def close(self):
+        """Finish the clip in progress and wait until all clips are written."""
+        if self.recording:
+            self._finish_clip()
+        self.jobs.put(None)
+        self.thread.join()
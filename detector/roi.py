@@ -0,0 +1,81 @@
+import json
+
+import cv2
+import numpy as np
+
+
+def load_roi_config(path):
+    """Read per-source region-of-interest polygons from a JSON file.
+
+    The file maps each source, exactly as given to --source, to its regions:
+
+        {"rtsp://tower1/stream": {"size": [1920, 1080],
+                                  "polygons": [[[0, 420], [1920, 380], [1920, 1080], [0, 1080]]],
+                                  "exclude": [[[1500, 700], [1600, 700], [1600, 800], [1500, 800]]]},
+         "*": {"polygons": [...]}}
+
+    Polygons are lists of [x, y] points in pixels of an image of the given size (the
+    frame size when "size" is omitted). "exclude" polygons are cut out of the regions,
+    and the "*" entry is used for sources that are not listed.
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def region_mask(config, source, min_inside=0.25):
+    """Build the RegionMask of a source from a loaded ROI config, or None if the source has no regions."""
+    entry = config.get(source, config.get('*'))
+    if entry is None:
+        return None
+    return RegionMask(entry['polygons'], entry.get('exclude', []), entry.get('size'), min_inside)
+
+
+class RegionMask:
+    """Region of interest of one source, as a pixel mask and its bounding box.
+
+    The mask, its bounding box and a summed-area table are computed once per frame
+    size. Only the bounding crop of the regions is run through the detector, at the
+    frame's native resolution, and boxes with less than min_inside of their area in the
+    mask are dropped with four lookups into the summed-area table per box.
+    """
+
+    def __init__(self, polygons, exclude=(), size=None, min_inside=0.25):
+        self.polygons = [np.array(p, dtype=np.float32) for p in polygons]
+        self.exclude = [np.array(p, dtype=np.float32) for p in exclude]
+        self.size = size
+        self.min_inside = min_inside
+        self.shape = None
+
+    def _prepare(self, width, height):
+        sx, sy = (width / self.size[0], height / self.size[1]) if self.size else (1.0, 1.0)
+        scale = np.array([sx, sy], dtype=np.float32)
+        mask = np.zeros((height, width), dtype=np.uint8)
+        cv2.fillPoly(mask, [np.round(p * scale).astype(np.int32) for p in self.polygons], 1)
+        if self.exclude:
+            cv2.fillPoly(mask, [np.round(p * scale).astype(np.int32) for p in self.exclude], 0)
+
+        x, y, w, h = cv2.boundingRect(mask)
+        self.bounds = (x, y, x + w, y + h)
+        self.integral = cv2.integral(mask)
+        self.shape = (height, width)
+
+    def crop(self, frame):
+        """Return the bounding crop of the regions (a view, no copy) and its (x, y) offset in the frame."""
+        if self.shape != frame.shape[:2]:
+            self._prepare(frame.shape[1], frame.shape[0])
+        x0, y0, x1, y1 = self.bounds
+        return frame[y0:y1, x0:x1], (x0, y0)
+
+    def apply(self, detections, offset):
+        """Map detections of a crop back onto the frame and drop the ones outside the regions."""
+        detections = detections.offset(*offset)
+        if len(detections) == 0:
+            return detections
+        height, width = self.shape
+        boxes = detections.xyxy.round().astype(int)
+        x0, x1 = boxes[:, 0].clip(0, width), boxes[:, 2].clip(0, width)
+        y0, y1 = boxes[:, 1].clip(0, height), boxes[:, 3].clip(0, height)
+        ii = self.integral
+        inside = ii[y1, x1] - ii[y0, x1] - ii[y1, x0] + ii[y0, x0]
+        area = (x1 - x0) * (y1 - y0)
+        return detections.filter((area > 0) & (inside >= self.min_inside * area))
@@ -0,0 +1,205 @@
+import os
+import json
+import time
+import queue
+import threading
+import email.parser
+import email.policy
+import socketserver
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import cv2
+import numpy as np
+
+
+class MicroBatcher:
+    """Coalesce frames submitted concurrently by many callers into batches for one model.
+
+    A batch is run as soon as max_batch frames are waiting, or max_wait seconds after
+    the first frame of the batch arrived, whichever comes first. A lone request is thus
+    delayed by at most max_wait, while a burst of requests shares batched inference.
+    """
+
+    def __init__(self, predict_fn, max_batch=8, max_wait=0.01):
+        self.predict_fn = predict_fn
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.requests = queue.Queue()
+        self.batches_run = 0
+        self.frames_run = 0
+        self.thread = threading.Thread(target=self._loop, daemon=True)
+        self.thread.start()
+
+    def submit(self, frame):
+        """Queue a frame for detection and return a Future resolving to its Detections."""
+        future = Future()
+        self.requests.put((frame, future))
+        return future
+
+    def _loop(self):
+        while True:
+            batch = [self.requests.get()]
+            deadline = time.perf_counter() + self.max_wait
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.requests.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            frames = [frame for frame, _ in batch]
+            try:
+                results = self.predict_fn(frames)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future), detections in zip(batch, results):
+                future.set_result(detections)
+            self.batches_run = self.batches_run + 1
+            self.frames_run = self.frames_run + len(frames)
+
+
+def read_images(content_type, body):
+    """Split a request body into (name, encoded image bytes): one raw image, or every file of a multipart form."""
+    if content_type.startswith('multipart/form-data'):
+        message = email.parser.BytesParser(policy=email.policy.HTTP).parsebytes(
+            b'Content-Type: ' + content_type.encode('latin-1') + b'\r\n\r\n' + body)
+        return [(part.get_filename() or part.get_param('name', header='content-disposition') or f'image{i}',
+                 part.get_payload(decode=True))
+                for i, part in enumerate(message.iter_parts())]
+    return [('image', body)]
+
+
+class DetectionService:
+    """Long-running detection server sharing one loaded model between many local clients.
+
+    Serves HTTP on a TCP port and/or a Unix domain socket (same protocol on both):
+      POST /detect   raw JPEG/PNG body, or multipart/form-data with one or more image files;
+                     optional ?conf= to only return boxes above a higher threshold
+      GET  /health   model class names and batching statistics
+      GET  /metrics  per-stage latencies in Prometheus text format
+    Images are decoded on the request threads and inferred through a MicroBatcher.
+    """
+
+    def __init__(self, backend, label_names, metrics, thresh=0.5, max_batch=8, max_wait=0.01,
+                 max_body=32 << 20):
+        self.label_names = label_names
+        self.metrics = metrics
+        self.thresh = thresh
+        self.max_body = max_body
+        self.batcher = MicroBatcher(lambda frames: backend.predict(frames, thresh), max_batch, max_wait)
+        self.servers = []
+
+    def detect(self, content_type, body, conf):
+        """Run detection on the images of one request and return the JSON-ready response."""
+        images = []
+        for name, data in read_images(content_type, body):
+            with self.metrics.time('decode'):
+                frame = cv2.imdecode(np.frombuffer(data or b'', dtype=np.uint8), cv2.IMREAD_COLOR)
+            if frame is None:
+                raise ValueError(f'Unable to decode image {name}.')
+            images.append((name, frame, self.batcher.submit(frame)))
+
+        response = []
+        for name, frame, future in images:
+            detections = future.result()
+            detections = detections.filter(detections.conf >= conf)
+            response.append({'name': name, 'width': frame.shape[1], 'height': frame.shape[0],
+                             'detections': [{'class': classname, 'confidence': round(float(c), 4), 'xyxy': xyxy}
+                                            for classname, c, xyxy in detections.rows(self.label_names)]})
+        return {'images': response}
+
+    def _handler(self):
+        service = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def _reply(self, status, body, content_type='application/json'):
+                if not isinstance(body, bytes):
+                    body = json.dumps(body, ensure_ascii=False).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                path = urlparse(self.path).path
+                if path == '/health':
+                    self._reply(200, {'status': 'ok', 'classes': service.label_names.tolist(),
+                                      'batches': service.batcher.batches_run, 'images': service.batcher.frames_run})
+                elif path == '/metrics':
+                    self._reply(200, service.metrics.prometheus_text().encode('utf-8'), 'text/plain; version=0.0.4')
+                else:
+                    self._reply(404, {'error': f'Unknown path {path}'})
+
+            def do_POST(self):
+                t_start = time.perf_counter()
+                url = urlparse(self.path)
+                if url.path != '/detect':
+                    self.close_connection = True
+                    self._reply(404, {'error': f'Unknown path {url.path}'})
+                    return
+                length = int(self.headers.get('Content-Length') or 0)
+                if length <= 0 or length > service.max_body:
+                    self.close_connection = True
+                    self._reply(413 if length > 0 else 400, {'error': f'Request body must be 1 to {service.max_body} bytes.'})
+                    return
+                body = self.rfile.read(length)
+                try:
+                    conf = max(service.thresh, float(parse_qs(url.query).get('conf', [service.thresh])[0]))
+                    result = service.detect(self.headers.get('Content-Type', ''), body, conf)
+                except ValueError as e:
+                    self._reply(400, {'error': str(e)})
+                    return
+                except Exception as e:
+                    self._reply(500, {'error': f'Detection failed: {e}'})
+                    return
+                self._reply(200, result)
+                service.metrics.record('request', time.perf_counter() - t_start)
+
+            def address_string(self):
+                # Clients of the Unix socket have no address
+                return self.client_address[0] if self.client_address else 'unix'
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def serve(self, host='127.0.0.1', port=None, socket_path=None):
+        """Start serving on the given TCP port and/or Unix socket path and block until interrupted."""
+        handler = self._handler()
+        if port:
+            self.servers.append(ThreadingHTTPServer((host, port), handler))
+            print(f'Serving detections on http://{host}:{port}/detect')
+        if socket_path:
+            # Defined here because socketserver only has Unix socket servers on platforms that support them
+            class ThreadingUnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+                daemon_threads = True
+
+            if os.path.exists(socket_path):
+                os.remove(socket_path)
+            self.servers.append(ThreadingUnixHTTPServer(socket_path, handler))
+            print(f'Serving detections on unix socket {socket_path}')
+
+        threads = [threading.Thread(target=server.serve_forever, daemon=True) for server in self.servers]
+        for thread in threads:
+            thread.start()
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            for server in self.servers:
+                server.shutdown()
+                server.server_close()
+            if socket_path and os.path.exists(socket_path):
+                os.remove(socket_path)
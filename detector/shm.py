@@ -0,0 +1,385 @@
+import os
+import sys
+import time
+import queue
+import multiprocessing
+from multiprocessing import resource_tracker, shared_memory
+
+import cv2
+import numpy as np
+
+from detector.sources import LIVE_SOURCE_TYPES, FrameSource
+
+# Slot states of a FrameRing. A slot cycles FREE -> WRITING -> READY -> READING -> DONE -> FREE:
+# the capture process writes it, a worker process runs the detector on it, and the main
+# process displays or reports it before handing it back.
+FREE, WRITING, READY, READING, DONE = range(5)
+
+# Columns of the ring header
+STATE, SEQ, T_CAPTURE = range(3)
+
+# Whether this process runs its own resource tracker, decided once before its first attach.
+# Keyed by pid so a forked child does not inherit its parent's answer.
+_own_tracker = {}
+
+
+def attach_shared_memory(name):
+    """Attach to a segment created by another process without registering it for cleanup in this one."""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        pass
+    # Python < 3.13 always registers the segment. A process forked after the resource tracker
+    # started shares the creator's tracker, where the segment is already registered, and must
+    # leave that registration alone. A process that starts its own tracker would unlink the
+    # segment when it exits, so there the registration is undone. The check has to happen before
+    # the first attach, which is what starts the tracker in a process that had none.
+    pid = os.getpid()
+    if pid not in _own_tracker:
+        _own_tracker[pid] = getattr(resource_tracker._resource_tracker, '_fd', None) is None
+    shm = shared_memory.SharedMemory(name=name)
+    if _own_tracker[pid]:
+        resource_tracker.unregister(shm._name, 'shared_memory')
+    return shm
+
+
+class FrameRing:
+    """Ring of preallocated frame buffers in shared memory, handed between processes without copies.
+
+    Frames live in one shared (slots, height, width, 3) uint8 array and each slot has a
+    small header row (state, sequence number, capture time in ns) in a second segment.
+    State changes happen under the slot's own lock, so the capture process and any
+    number of workers can claim different slots concurrently. Frame data is only
+    touched by whoever holds the slot in the matching state, never under a lock.
+    """
+
+    def __init__(self, data, header, slots, shape, locks, owner):
+        self.data = data
+        self.header_shm = header
+        self.slots = slots
+        self.shape = tuple(shape)
+        self.locks = locks
+        self.owner = owner
+        self.frames = np.ndarray((slots,) + self.shape, dtype=np.uint8, buffer=data.buf)
+        self.header = np.ndarray((slots, 3), dtype=np.int64, buffer=header.buf)
+
+    @classmethod
+    def create(cls, slots, shape, locks):
+        data = shared_memory.SharedMemory(create=True, size=slots * int(np.prod(shape)))
+        header = shared_memory.SharedMemory(create=True, size=slots * 3 * 8)
+        ring = cls(data, header, slots, shape, locks, owner=True)
+        ring.header[:] = 0
+        return ring
+
+    @classmethod
+    def attach(cls, descriptor, locks):
+        data_name, header_name, slots, shape = descriptor
+        return cls(attach_shared_memory(data_name), attach_shared_memory(header_name), slots, shape, locks, owner=False)
+
+    def descriptor(self):
+        return (self.data.name, self.header_shm.name, self.slots, self.shape)
+
+    def frame(self, slot):
+        """The frame buffer of a slot, as a view into shared memory."""
+        return self.frames[slot]
+
+    def claim_write(self, overwrite):
+        """Claim a free slot for writing. With overwrite, the oldest unclaimed frame is replaced if no slot is free.
+
+        Returns (slot, overwritten) or (None, False) if every slot is busy.
+        """
+        oldest, oldest_seq = None, None
+        for slot in range(self.slots):
+            with self.locks[slot]:
+                if self.header[slot, STATE] == FREE:
+                    self.header[slot, STATE] = WRITING
+                    return slot, False
+            if overwrite and self.header[slot, STATE] == READY and (oldest is None or self.header[slot, SEQ] < oldest_seq):
+                oldest, oldest_seq = slot, self.header[slot, SEQ]
+        if oldest is not None:
+            with self.locks[oldest]:
+                if self.header[oldest, STATE] == READY:
+                    self.header[oldest, STATE] = WRITING
+                    return oldest, True
+        return None, False
+
+    def commit(self, slot, seq, t_capture_ns):
+        with self.locks[slot]:
+            self.header[slot, SEQ] = seq
+            self.header[slot, T_CAPTURE] = t_capture_ns
+            self.header[slot, STATE] = READY
+
+    def oldest_ready(self):
+        """(seq, slot) of the oldest frame waiting for a worker, or None. Not locked, only a hint for claim_read."""
+        ready = np.flatnonzero(self.header[:, STATE] == READY)
+        if len(ready) == 0:
+            return None
+        slot = ready[np.argmin(self.header[ready, SEQ])]
+        return int(self.header[slot, SEQ]), int(slot)
+
+    def claim_read(self, slot, seq):
+        """Claim a ready slot for inference. Returns False if another worker or an overwrite got there first."""
+        with self.locks[slot]:
+            if self.header[slot, STATE] == READY and self.header[slot, SEQ] == seq:
+                self.header[slot, STATE] = READING
+                return True
+        return False
+
+    def mark_done(self, slot):
+        with self.locks[slot]:
+            self.header[slot, STATE] = DONE
+
+    def release(self, slot):
+        with self.locks[slot]:
+            self.header[slot, STATE] = FREE
+
+    def idle(self):
+        return bool((self.header[:, STATE] == FREE).all())
+
+    def close(self):
+        # Views must go before the segments can be closed
+        del self.frames, self.header
+        try:
+            self.data.close()
+            self.header_shm.close()
+        except BufferError:
+            # A caller still holds a frame view, the mapping goes away with the process
+            pass
+        if self.owner:
+            for segment in (self.data, self.header_shm):
+                try:
+                    segment.unlink()
+                except FileNotFoundError:
+                    # Already removed by a tracker that exited with its registration
+                    pass
+
+
+def capture_main(index, source, source_type, resolution, resize_to, info_queue, ring_queue, locks,
+                 frames_ready, stop_event, finished):
+    """Capture process: read frames of one source and write them into its FrameRing."""
+    # Only the main process writes to stdout, which may carry the detection stream
+    sys.stdout = sys.stderr
+    parent_pid = os.getppid()
+    frame_source = FrameSource(source, source_type, resolution)
+    live = source_type in LIVE_SOURCE_TYPES
+    dropped = 0
+    ring = None
+    try:
+        frame = frame_source.read()
+        if frame is not None and resize_to is not None:
+            frame = cv2.resize(frame, resize_to)
+        # The ring is sized after the first frame, so the main process creates it only now
+        info_queue.put(('shape', index, frame.shape if frame is not None else None))
+        if frame is None:
+            return
+        ring = FrameRing.attach(ring_queue.get(), locks)
+
+        while frame is not None and not stop_event.is_set():
+            if os.getppid() != parent_pid:
+                break # The main process died without stopping us
+            slot, overwritten = ring.claim_write(overwrite=live)
+            if slot is None:
+                if live:
+                    dropped = dropped + 1
+                else:
+                    time.sleep(0.001)
+                    continue
+            else:
+                if frame.shape != ring.shape:
+                    frame = cv2.resize(frame, (ring.shape[1], ring.shape[0]))
+                ring.frame(slot)[:] = frame
+                ring.commit(slot, frame_source.frame_count, time.perf_counter_ns())
+                if overwritten:
+                    dropped = dropped + 1
+                else:
+                    frames_ready.release()
+
+            frame = frame_source.read()
+            if frame is not None and resize_to is not None:
+                frame = cv2.resize(frame, resize_to)
+    finally:
+        info_queue.put(('dropped', index, dropped))
+        finished.set()
+        frame_source.release()
+        if ring is not None:
+            ring.close()
+
+
+def worker_main(model_args, conf, descriptors, locks, frames_ready, stop_event, ready_queue, results):
+    """Inference process: load its own copy of the model and run it on frames claimed from the rings in place."""
+    from detector.backends import load_backend, warm_up
+    sys.stdout = sys.stderr
+    parent_pid = os.getppid()
+    rings = [FrameRing.attach(d, l) for d, l in zip(descriptors, locks)]
+    backend = load_backend(*model_args)
+    # Warm up on frames of the first ring's size before reporting ready, so the first real frame is not slowed down
+    warm_up(backend, rings[0].shape[:2])
+    ready_queue.put(backend.names)
+
+    try:
+        while not stop_event.is_set():
+            if os.getppid() != parent_pid:
+                break # The main process died without stopping us, don't keep the model and the rings alive
+            if not frames_ready.acquire(timeout=0.1):
+                continue
+            # Take the oldest waiting frame of any source. Each posted frame has one semaphore count,
+            # so if another worker claims the frame seen here, one of the other waiting frames is ours.
+            claimed = None
+            while claimed is None:
+                candidates = [(c[0], c[1], r) for r, c in enumerate(ring.oldest_ready() for ring in rings) if c is not None]
+                if not candidates:
+                    break
+                for seq, slot, r in sorted(candidates):
+                    if rings[r].claim_read(slot, seq):
+                        claimed = (r, slot, seq)
+                        break
+            if claimed is None:
+                continue
+            r, slot, seq = claimed
+            t_start = time.perf_counter()
+            detections = backend.predict([rings[r].frame(slot)], conf)[0]
+            t_infer = time.perf_counter() - t_start
+            t_capture_ns = int(rings[r].header[slot, T_CAPTURE])
+            rings[r].mark_done(slot)
+            results.put((r, slot, seq, t_capture_ns, detections, t_infer))
+    finally:
+        for ring in rings:
+            ring.close()
+
+
+class ProcessDetector:
+    """Runs capture and inference in separate processes connected by shared-memory frame rings.
+
+    Each source gets a capture process and a FrameRing of `slots` frames; `workers`
+    inference processes each load the model and claim the oldest ready frame of any
+    ring. Only the small detection results travel through a queue, frames stay in
+    shared memory, and the main process reads them in place from results().
+
+    Processes are forked, so this must be started before the main process loads a
+    model or starts any thread pools.
+    """
+
+    def __init__(self, sources, source_types, model_args, conf, workers=2, slots=4,
+                 resolution=None, resize_to=None):
+        self.sources = sources
+        self.source_types = source_types
+        self.model_args = model_args
+        self.conf = conf
+        self.workers = workers
+        self.slots = slots
+        self.resolution = resolution
+        self.resize_to = resize_to
+        self.ctx = multiprocessing.get_context('fork')
+        self.stop_event = self.ctx.Event()
+        self.frames_ready = self.ctx.Semaphore(0)
+        self.ready_queue = self.ctx.Queue()
+        self.results_queue = self.ctx.Queue()
+        self.info_queue = self.ctx.Queue()
+        self.locks = [[self.ctx.Lock() for _ in range(slots)] for _ in sources]
+        self.finished = [self.ctx.Event() for _ in sources]
+        self.rings = []
+        self.processes = []
+        self.dropped = [0 for _ in sources]
+        self.names = None
+
+    def start(self):
+        """Start the capture processes, create their rings and start the workers. Returns the model's class names."""
+        ring_queues = [self.ctx.Queue() for _ in self.sources]
+        for i, (source, source_type) in enumerate(zip(self.sources, self.source_types)):
+            p = self.ctx.Process(target=capture_main, daemon=True,
+                                 args=(i, source, source_type, self.resolution, self.resize_to, self.info_queue,
+                                       ring_queues[i], self.locks[i], self.frames_ready, self.stop_event, self.finished[i]))
+            p.start()
+            self.processes.append(p)
+
+        shapes = {}
+        while len(shapes) < len(self.sources):
+            kind, i, value = self.info_queue.get()
+            if kind == 'shape':
+                shapes[i] = value
+            else:
+                self.dropped[i] = value
+        for i in range(len(self.sources)):
+            # A source that produced no frame at all still gets a minimal ring, so indices stay aligned
+            ring = FrameRing.create(self.slots, shapes[i] or (1, 1, 3), self.locks[i])
+            self.rings.append(ring)
+            if shapes[i] is not None:
+                ring_queues[i].put(ring.descriptor())
+
+        # The first worker starts alone, so it exports .pt weights once and the others reuse the export
+        descriptors = [ring.descriptor() for ring in self.rings]
+        for i in range(self.workers):
+            p = self.ctx.Process(target=worker_main, daemon=True,
+                                 args=(self.model_args, self.conf, descriptors, self.locks,
+                                       self.frames_ready, self.stop_event, self.ready_queue, self.results_queue))
+            p.start()
+            self.processes.append(p)
+            if i == 0:
+                self._wait_ready(1)
+        self._wait_ready(self.workers - 1)
+        return self.names
+
+    def _wait_ready(self, count):
+        while count > 0:
+            try:
+                self.names = self.ready_queue.get(timeout=1)
+            except queue.Empty:
+                if any(p.exitcode not in (None, 0) for p in self.processes[len(self.sources):]):
+                    self.stop()
+                    raise RuntimeError('An inference worker failed to start.')
+                continue
+            count = count - 1
+
+    def _finished(self):
+        return all(e.is_set() for e in self.finished) and all(ring.idle() for ring in self.rings)
+
+    def results(self):
+        """Yield (source_index, frame_index, t_capture, frame, detections, inference_seconds) as workers finish frames.
+
+        The frame is a view into shared memory and is only valid until the next item is
+        requested, when its slot is handed back to the capture process. Frames of video
+        files come out in order; live sources yield frames as soon as they are done.
+        """
+        pending = [{} for _ in self.sources]
+        next_seq = [1 for _ in self.sources]
+        while True:
+            try:
+                item = self.results_queue.get(timeout=0.1)
+            except queue.Empty:
+                if self._finished():
+                    return
+                if any(p.exitcode not in (None, 0) for p in self.processes[len(self.sources):]):
+                    raise RuntimeError('An inference worker stopped unexpectedly.')
+                continue
+
+            r, slot, seq, t_capture_ns, detections, t_infer = item
+            if self.source_types[r] in LIVE_SOURCE_TYPES:
+                ordered = [(slot, seq, t_capture_ns, detections, t_infer)]
+            else:
+                pending[r][seq] = (slot, seq, t_capture_ns, detections, t_infer)
+                ordered = []
+                while next_seq[r] in pending[r]:
+                    ordered.append(pending[r].pop(next_seq[r]))
+                    next_seq[r] = next_seq[r] + 1
+
+            for slot, seq, t_capture_ns, detections, t_infer in ordered:
+                try:
+                    yield r, seq, t_capture_ns / 1e9, self.rings[r].frame(slot), detections, t_infer
+                finally:
+                    self.rings[r].release(slot)
+
+    def stop(self):
+        self.stop_event.set()
+        for p in self.processes:
+            p.join(timeout=5)
+            if p.is_alive():
+                p.terminate()
+        while True:
+            try:
+                kind, i, value = self.info_queue.get_nowait()
+            except queue.Empty:
+                break
+            if kind == 'dropped':
+                self.dropped[i] = value
+        for ring in self.rings:
+            ring.close()
@@ -0,0 +1,155 @@
+import os
+import time
+
+import cv2
+
+from detector.loader import PrefetchLoader, iter_image_files
+
+# File extensions recognized as images and videos
+img_ext_list = ['.jpg','.JPG','.jpeg','.JPEG','.png','.PNG','.bmp','.BMP']
+vid_ext_list = ['.avi','.mov','.mp4','.mkv','.wmv']
+
+LIVE_SOURCE_TYPES = ('usb', 'picamera', 'stream')
+
+# Returned by FrameSource.read() instead of a frame when the image's detections came from the cache
+CACHE_HIT = object()
+
+
+def get_source_type(img_source):
+    """Determine if an image source is a file, folder, video, USB camera, Picamera or network stream URL.
+
+    Raises ValueError with a user-facing message if the source is not supported.
+    """
+    if os.path.isdir(img_source):
+        return 'folder'
+    elif '://' in img_source:
+        return 'stream'
+    elif os.path.isfile(img_source):
+        _, ext = os.path.splitext(img_source)
+        if ext in img_ext_list:
+            return 'image'
+        elif ext in vid_ext_list:
+            return 'video'
+        else:
+            raise ValueError(f'File extension {ext} is not supported.')
+    elif 'usb' in img_source:
+        return 'usb'
+    elif 'picamera' in img_source:
+        return 'picamera'
+    else:
+        raise ValueError(f'Input {img_source} is invalid. Please try again.')
+
+
+class FrameSource:
+    """Uniform frame reader over image files, image folders, videos and cameras.
+
+    Images are decoded ahead of time by a PrefetchLoader: `prefetch` images in flight
+    on `workers` threads (or processes), resized to `resize_to` on the workers if given.
+    Folder files are listed lazily, including subfolders when `recursive` is set.
+    With a DetectionCache, cached images are not decoded: read() returns CACHE_HIT
+    and their detections are left in self.cached.
+    """
+
+    def __init__(self, img_source, source_type, resolution=None, metrics=None,
+                 recursive=False, prefetch=8, workers=4, resize_to=None, use_processes=False, cache=None):
+        self.img_source = img_source
+        self.metrics = metrics
+        self.source_type = source_type
+        self.live = source_type in LIVE_SOURCE_TYPES
+        self.cap = None
+        self.loader = None
+        self.img_path = None
+        self.cached = None
+        self.frame_count = 0
+        self.video_fps = None
+
+        if source_type == 'image' or source_type == 'folder':
+            paths = [img_source] if source_type == 'image' else iter_image_files(img_source, img_ext_list, recursive)
+            lookup = cache.lookup if cache is not None else None
+            self.loader = PrefetchLoader(paths, prefetch, workers, resize_to, use_processes, lookup)
+        elif source_type == 'video' or source_type == 'usb' or source_type == 'stream':
+            if source_type == 'video' or source_type == 'stream': cap_arg = img_source
+            elif source_type == 'usb': cap_arg = int(img_source[3:])
+            self.cap = cv2.VideoCapture(cap_arg)
+
+            # Set camera or video resolution if specified by user
+            if resolution:
+                self.cap.set(3, resolution[0])
+                self.cap.set(4, resolution[1])
+
+            # Frame rate the video file was recorded at, 30 if the container does not say
+            if source_type == 'video':
+                self.video_fps = self.cap.get(cv2.CAP_PROP_FPS) or 30.0
+
+        elif source_type == 'picamera':
+            from picamera2 import Picamera2
+            self.cap = Picamera2()
+            self.cap.configure(self.cap.create_video_configuration(main={"format": 'RGB888', "size": resolution}))
+            self.cap.start()
+
+    def read(self):
+        """Return the next frame, or None once the source is exhausted or disconnected."""
+        t_start = time.perf_counter()
+        frame = self._read()
+        if self.metrics is not None:
+            self.metrics.record('decode', time.perf_counter() - t_start)
+        if frame is not None:
+            self.frame_count = self.frame_count + 1
+        return frame
+
+    def frame_name(self):
+        """Name of the most recently read frame: its filename for image sources, otherwise its frame number."""
+        if self.source_type == 'image' or self.source_type == 'folder':
+            return self.img_path
+        return f'frame {self.frame_count}'
+
+    def origin(self):
+        """Where the most recently read frame came from: its filename for image sources, otherwise the source itself."""
+        if self.source_type == 'image' or self.source_type == 'folder':
+            return self.img_path
+        return self.img_source
+
+    def _read(self):
+        if self.source_type == 'image' or self.source_type == 'folder': # If source is image or image folder, take the next image decoded by the loader
+            item = self.loader.next()
+            if item is None:
+                print('All images have been processed. Exiting program.')
+                return None
+            self.img_path, frame, self.cached = item
+            return frame if frame is not None else CACHE_HIT
+
+        elif self.source_type == 'video': # If source is a video, load next frame from video file
+            ret, frame = self.cap.read()
+            if not ret:
+                print('Reached end of the video file. Exiting program.')
+                return None
+            return frame
+
+        elif self.source_type == 'usb': # If source is a USB camera, grab frame from camera
+            ret, frame = self.cap.read()
+            if (frame is None) or (not ret):
+                print('Unable to read frames from the camera. This indicates the camera is disconnected or not working. Exiting program.')
+                return None
+            return frame
+
+        elif self.source_type == 'stream': # If source is a network stream (e.g. RTSP camera), grab the next frame from it
+            ret, frame = self.cap.read()
+            if (frame is None) or (not ret):
+                print(f'Unable to read frames from the stream {self.img_source}. This indicates the stream is down or not reachable.')
+                return None
+            return frame
+
+        elif self.source_type == 'picamera': # If source is a Picamera, grab frames using picamera interface
+            frame = self.cap.capture_array()
+            if (frame is None):
+                print('Unable to read frames from the Picamera. This indicates the camera is disconnected or not working. Exiting program.')
+                return None
+            return frame
+
+    def release(self):
+        if self.loader is not None:
+            self.loader.close()
+        if self.source_type == 'video' or self.source_type == 'usb' or self.source_type == 'stream':
+            self.cap.release()
+        elif self.source_type == 'picamera':
+            self.cap.stop()
@@ -0,0 +1,89 @@
+import numpy as np
+
+from detector.backends import NMS_IOU
+from detector.postprocess import Detections, batched_nms
+
+TILE_REGIONS = ['all', 'horizon', 'flagged']
+
+
+def tile_windows(width, height, tile_size, overlap, y_range=None):
+    """Windows (x0, y0, x1, y1) of size tile_size covering the frame, or the rows y_range=(y0, y1) of it.
+
+    Neighbouring tiles overlap by the given fraction of tile_size. The last tile of each
+    row and column is shifted back to end at the frame edge, so all tiles have full size
+    when the frame is at least as large as a tile.
+    """
+    y_start, y_stop = y_range if y_range else (0, height)
+    step = max(1, int(tile_size * (1 - overlap)))
+
+    def starts(lo, hi):
+        if hi - lo <= tile_size:
+            return [lo]
+        positions = list(range(lo, hi - tile_size, step))
+        positions.append(hi - tile_size)
+        return positions
+
+    return np.array([(x0, y0, min(x0 + tile_size, width), min(y0 + tile_size, y_stop))
+                     for y0 in starts(y_start, y_stop) for x0 in starts(0, width)], dtype=int)
+
+
+class TiledDetector:
+    """SAHI-style sliced inference so small, distant smoke keeps enough pixels to be detected.
+
+    region selects which tiles are run:
+      'all'      tiles over the whole frame
+      'horizon'  tiles only over the horizontal band horizon=(top, bottom), as fractions of the frame height
+      'flagged'  tiles only where a full-frame pass found something above flag_thresh
+    A full-frame pass always runs too, so large nearby fires are still seen whole. The
+    full frame and its tiles go through the backend as a single batch (two batches in
+    'flagged' mode), and boxes from all of them are merged with class-aware NMS.
+    """
+
+    def __init__(self, backend, tile_size=480, overlap=0.2, region='all', horizon=(0.0, 1.0), flag_thresh=0.1):
+        self.backend = backend
+        self.tile_size = tile_size
+        self.overlap = overlap
+        self.region = region
+        self.horizon = horizon
+        self.flag_thresh = flag_thresh
+        self.tiles_run = 0
+
+    def _windows(self, width, height):
+        if self.region == 'horizon':
+            y0, y1 = int(self.horizon[0] * height), int(self.horizon[1] * height)
+            if y1 - y0 < self.tile_size:
+                # Grow a thin band around its center to a full tile height
+                y0 = max(0, min((y0 + y1 - self.tile_size) // 2, height - self.tile_size))
+                y1 = min(height, y0 + self.tile_size)
+            y_range = (y0, y1)
+            return tile_windows(width, height, self.tile_size, self.overlap, y_range)
+        return tile_windows(width, height, self.tile_size, self.overlap)
+
+    def predict(self, frame, conf):
+        """Return the merged detections of the full frame and its tiles."""
+        height, width = frame.shape[:2]
+        windows = self._windows(width, height)
+
+        if self.region == 'flagged':
+            # Cheap full-frame pass at a low threshold decides which tiles deserve a closer look
+            full = self.backend.predict([frame], min(conf, self.flag_thresh))[0]
+            flagged = full.xyxy
+            if len(flagged) == 0:
+                return full.filter(full.conf >= conf)
+            overlaps = ((windows[:, None, 0] < flagged[None, :, 2]) & (windows[:, None, 2] > flagged[None, :, 0]) &
+                        (windows[:, None, 1] < flagged[None, :, 3]) & (windows[:, None, 3] > flagged[None, :, 1]))
+            windows = windows[overlaps.any(axis=1)]
+            crops = [frame[y0:y1, x0:x1] for x0, y0, x1, y1 in windows]
+            tile_detections = self.backend.predict(crops, conf) if crops else []
+            parts = [full.filter(full.conf >= conf)]
+        else:
+            crops = [frame[y0:y1, x0:x1] for x0, y0, x1, y1 in windows]
+            all_detections = self.backend.predict([frame] + crops, conf)
+            tile_detections = all_detections[1:]
+            parts = [all_detections[0]]
+
+        self.tiles_run = self.tiles_run + len(windows)
+        for (x0, y0, _, _), detections in zip(windows, tile_detections):
+            if len(detections):
+                parts.append(detections.offset(x0, y0))
+        return batched_nms(Detections.concatenate(parts), NMS_IOU)
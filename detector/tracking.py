@@ -0,0 +1,231 @@
+import time
+import json
+import sys
+from collections import deque
+
+import numpy as np
+
+from detector.evaluate import box_iou
+
+
+class Track:
+    """A fire/smoke object followed across frames."""
+
+    def __init__(self, track_id, cls, xyxy, conf, frame_index, window):
+        self.id = track_id
+        self.cls = cls
+        self.xyxy = xyxy
+        self.conf = conf
+        self.max_conf = conf
+        self.velocity = np.zeros(4, dtype=np.float32)
+        self.history = deque([True], maxlen=window)
+        self.misses = 0
+        self.first_frame = frame_index
+        self.last_frame = frame_index
+        self.confirmed = False
+        self.observations_since_event = 0
+
+    def predicted_box(self):
+        return self.xyxy + self.velocity
+
+    def update(self, xyxy, conf, frame_index):
+        # Exponentially smoothed box velocity, used to predict where the object is next frame
+        self.velocity = 0.7 * self.velocity + 0.3 * (xyxy - self.xyxy)
+        self.xyxy = xyxy
+        self.conf = conf
+        self.max_conf = max(self.max_conf, conf)
+        self.history.append(True)
+        self.misses = 0
+        self.last_frame = frame_index
+        self.observations_since_event = self.observations_since_event + 1
+
+    def mark_missed(self):
+        self.xyxy = self.predicted_box()
+        self.history.append(False)
+        self.misses = self.misses + 1
+        self.observations_since_event = self.observations_since_event + 1
+
+
+def greedy_match(iou, min_iou):
+    """Match rows to columns by descending IoU. Returns (row, col) pairs."""
+    if iou.size == 0:
+        return []
+    rows, cols = np.where(iou >= min_iou)
+    order = np.argsort(-iou[rows, cols])
+    used_rows, used_cols, pairs = set(), set(), []
+    for r, c in zip(rows[order].tolist(), cols[order].tolist()):
+        if r not in used_rows and c not in used_cols:
+            used_rows.add(r)
+            used_cols.add(c)
+            pairs.append((r, c))
+    return pairs
+
+
+class ByteTracker:
+    """Lightweight CPU tracker in the style of ByteTrack.
+
+    Detections at or above high_thresh are matched to the predicted boxes of existing
+    tracks first; detections between the detector threshold and high_thresh are then
+    only used to keep already-known tracks alive (a faint plume that dips in confidence
+    keeps its ID), never to start new ones. Boxes of different classes never match.
+    A track is confirmed once it was seen in min_hits of the last `window` observed
+    frames, and dropped after max_misses observed frames without a match.
+
+    While every track is confirmed, only every infer_stride-th frame needs to be run
+    through the detector (see should_infer); the tracks coast in between.
+    """
+
+    def __init__(self, high_thresh=0.5, match_iou=0.3, min_hits=3, window=5, max_misses=15, infer_stride=1):
+        self.high_thresh = high_thresh
+        self.match_iou = match_iou
+        self.min_hits = min_hits
+        self.window = window
+        self.max_misses = max_misses
+        self.infer_stride = infer_stride
+        self.tracks = []
+        self.next_id = 1
+        self.last_input = None
+        self.frames_coasted = 0
+        self.frames_skipped = 0
+
+    def _associate(self, tracks, detections, indices):
+        if not tracks or len(indices) == 0:
+            return [], list(range(len(tracks))), list(indices)
+        track_boxes = np.stack([t.predicted_box() for t in tracks])
+        track_cls = np.array([t.cls for t in tracks])
+        iou = box_iou(track_boxes, detections.xyxy[indices])
+        iou[track_cls[:, None] != detections.cls[indices][None, :]] = 0
+        pairs = greedy_match(iou, self.match_iou)
+        matched_tracks = {r for r, _ in pairs}
+        matched_dets = {c for _, c in pairs}
+        matches = [(r, indices[c]) for r, c in pairs]
+        unmatched_tracks = [r for r in range(len(tracks)) if r not in matched_tracks]
+        unmatched_dets = [indices[c] for c in range(len(indices)) if c not in matched_dets]
+        return matches, unmatched_tracks, unmatched_dets
+
+    def update(self, detections, frame_index):
+        """Feed one frame of detections. Returns (tracks, removed_tracks).
+
+        Passing the very same Detections object as the previous call means the frame was
+        not actually inferred (motion gate or stride skip): tracks coast on their velocity
+        and neither hits nor misses are counted.
+        """
+        if detections is self.last_input:
+            for track in self.tracks:
+                track.xyxy = track.predicted_box()
+            return self.tracks, []
+        self.last_input = detections
+
+        high = np.flatnonzero(detections.conf >= self.high_thresh)
+        low = np.flatnonzero(detections.conf < self.high_thresh)
+
+        # First association: confident detections against all tracks
+        matches, unmatched_tracks, unmatched_high = self._associate(self.tracks, detections, high)
+        for t, d in matches:
+            self.tracks[t].update(detections.xyxy[d], float(detections.conf[d]), frame_index)
+
+        # Second association: weak detections only against the tracks left over
+        remaining = [self.tracks[t] for t in unmatched_tracks]
+        matches_low, still_unmatched, _ = self._associate(remaining, detections, low)
+        for t, d in matches_low:
+            remaining[t].update(detections.xyxy[d], float(detections.conf[d]), frame_index)
+        for t in still_unmatched:
+            remaining[t].mark_missed()
+
+        # Unmatched confident detections start new tracks
+        for d in unmatched_high:
+            self.tracks.append(Track(self.next_id, int(detections.cls[d]), detections.xyxy[d].copy(),
+                                     float(detections.conf[d]), frame_index, self.window))
+            self.next_id = self.next_id + 1
+
+        for track in self.tracks:
+            if not track.confirmed and sum(track.history) >= self.min_hits:
+                track.confirmed = True
+
+        removed = [t for t in self.tracks if t.misses > self.max_misses]
+        self.tracks = [t for t in self.tracks if t.misses <= self.max_misses]
+        return self.tracks, removed
+
+    def stable(self):
+        """True when every current track is confirmed, so frames in between may be skipped."""
+        return bool(self.tracks) and all(t.confirmed for t in self.tracks)
+
+    def should_infer(self):
+        """Return True if the detector has to run on the next frame.
+
+        Nothing is skipped while any track is still unconfirmed or there are no tracks at
+        all, so new fires are never picked up later than without the stride.
+        """
+        if self.infer_stride > 1 and self.stable() and self.frames_coasted < self.infer_stride - 1:
+            self.frames_coasted = self.frames_coasted + 1
+            self.frames_skipped = self.frames_skipped + 1
+            return False
+        self.frames_coasted = 0
+        return True
+
+
+class AlertEngine:
+    """Turns confirmed tracks into debounced alert events.
+
+    A 'start' event is emitted when a track gets confirmed, an 'update' every
+    update_every observed frames while it lasts, and an 'end' when it is dropped.
+    """
+
+    def __init__(self, label_names, source, update_every=30):
+        self.label_names = label_names
+        self.source = source
+        self.update_every = update_every
+        self.active = set()
+
+    def _event(self, kind, track, frame_index):
+        x1, y1, x2, y2 = (int(v) for v in track.xyxy)
+        return {'event': kind, 'track_id': track.id, 'class': self.label_names[track.cls],
+                'frame': frame_index, 'timestamp': round(time.time(), 3), 'source': self.source,
+                'confidence': round(track.conf, 4), 'max_confidence': round(track.max_conf, 4),
+                'xyxy': [x1, y1, x2, y2], 'first_frame': track.first_frame, 'last_frame': track.last_frame}
+
+    def step(self, tracks, removed, frame_index):
+        """Return the events of one frame."""
+        events = []
+        for track in tracks:
+            if track.confirmed and track.id not in self.active:
+                self.active.add(track.id)
+                track.observations_since_event = 0
+                events.append(self._event('start', track, frame_index))
+            elif track.id in self.active and track.observations_since_event >= self.update_every:
+                track.observations_since_event = 0
+                events.append(self._event('update', track, frame_index))
+        for track in removed:
+            if track.id in self.active:
+                self.active.discard(track.id)
+                events.append(self._event('end', track, frame_index))
+        return events
+
+    def finish(self, frame_index):
+        """End events for all alerts still active when the source stops."""
+        return [{'event': 'end', 'track_id': track_id, 'frame': frame_index, 'timestamp': round(time.time(), 3),
+                 'source': self.source} for track_id in sorted(self.active)]
+
+
+class EventWriter:
+    """Writes alert events as JSON Lines to a file or stdout."""
+
+    def __init__(self, path='-', stream=None):
+        if path == '-':
+            self.f = stream if stream is not None else sys.stdout
+            self.owns_file = False
+        else:
+            self.f = open(path, 'a', encoding='utf-8')
+            self.owns_file = True
+
+    def write(self, events):
+        for event in events:
+            self.f.write(json.dumps(event, ensure_ascii=False) + '\n')
+        if events:
+            self.f.flush()
+
+    def close(self):
+        if self.owns_file:
+            self.f.close()
+        else:
+            self.f.flush()
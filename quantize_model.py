@@ -0,0 +1,111 @@
+import os
+import sys
+import json
+import argparse
+
+from detector.backends import OnnxBackend, OpenVinoBackend
+from detector.evaluate import baseline_from_results, evaluate_map50, list_images
+from detector.quantize import quantize_onnx, quantize_openvino
+
+# Define and parse user input arguments
+
+parser = argparse.ArgumentParser(description='Quantize the fire/smoke detector to INT8 and compare its accuracy against FP32.')
+parser.add_argument('--model', help='Path to YOLO model file (example: "runs/detect/train/weights/best.pt")',
+                    required=True)
+parser.add_argument('--calib', help='Folder of representative tower images used to calibrate the INT8 ranges (example: "calib_images")',
+                    required=True)
+parser.add_argument('--val', help='Held-out image folder with YOLO labels (images/ and labels/ subfolders, or .txt labels next to the images) \
+                    used to compare mAP50 of the FP32 and INT8 models',
+                    default=None)
+parser.add_argument('--backend', help='Export format to quantize: "onnx" (default, onnxruntime) or "openvino" (NNCF)',
+                    choices=['onnx','openvino'], default='onnx')
+parser.add_argument('--imgsz', help='Inference input size in pixels, matching the training imgsz by default (example: "480")',
+                    type=int, default=480)
+parser.add_argument('--calib-size', help='Maximum number of calibration images to use (example: "300")',
+                    type=int, default=300)
+parser.add_argument('--results', help='Ultralytics results.csv of the training run, used as the FP32 baseline',
+                    default='train/results.csv')
+parser.add_argument('--report', help='File to write the JSON comparison report to',
+                    default='quantization_report.json')
+
+args = parser.parse_args()
+
+
+def model_size(path):
+    """Size in bytes of an ONNX file or an OpenVINO model folder."""
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    return sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path))
+
+
+# Check if model file and image folders exist
+if (not os.path.exists(args.model)):
+    print('ERROR: Model path is invalid or model was not found. Make sure the model filename was entered correctly.')
+    sys.exit(0)
+
+calib_images = list_images(args.calib)[:args.calib_size]
+if not calib_images:
+    print(f'No calibration images found in {args.calib}. Please try again.')
+    sys.exit(0)
+
+val_images = []
+if args.val:
+    val_images = list_images(args.val)
+    if not val_images:
+        print(f'No validation images found in {args.val}. Please try again.')
+        sys.exit(0)
+
+# Quantize the model
+print(f'Calibrating on {len(calib_images)} images...')
+if args.backend == 'onnx':
+    fp32_path, int8_path = quantize_onnx(args.model, calib_images, args.imgsz)
+    backend_class = OnnxBackend
+else:
+    fp32_path, int8_path = quantize_openvino(args.model, calib_images, args.imgsz)
+    backend_class = OpenVinoBackend
+print(f'INT8 model saved to {int8_path}')
+
+report = {
+    'backend': args.backend,
+    'imgsz': args.imgsz,
+    'fp32_model': fp32_path,
+    'int8_model': int8_path,
+    'calibration_images': len(calib_images),
+}
+
+if os.path.exists(args.results):
+    report['training_baseline'] = baseline_from_results(args.results)
+
+# Compare accuracy on the held-out set. The FP32 export is evaluated with the same code
+# as the INT8 model, so the difference measures quantization and nothing else.
+if val_images:
+    print(f'Evaluating on {len(val_images)} held-out images...')
+    fp32_map50, fp32_per_class = evaluate_map50(backend_class(fp32_path, args.imgsz), val_images)
+    int8_map50, int8_per_class = evaluate_map50(backend_class(int8_path, args.imgsz), val_images)
+    report['held_out'] = {
+        'images': len(val_images),
+        'fp32_mAP50': fp32_map50,
+        'int8_mAP50': int8_map50,
+        'mAP50_drop': fp32_map50 - int8_map50,
+        'fp32_per_class_AP50': fp32_per_class,
+        'int8_per_class_AP50': int8_per_class,
+    }
+
+# Print and save report
+print('\n--- QUANTIZATION REPORT ---')
+if 'training_baseline' in report:
+    baseline = report['training_baseline']
+    print(f'Training baseline (epoch {baseline["epoch"]}): mAP50 {baseline["mAP50"]:.4f}')
+if 'held_out' in report:
+    held_out = report['held_out']
+    print(f'Held-out FP32 mAP50: {held_out["fp32_mAP50"]:.4f}')
+    print(f'Held-out INT8 mAP50: {held_out["int8_mAP50"]:.4f} (drop {held_out["mAP50_drop"]:+.4f})')
+fp32_size = model_size(fp32_path)
+int8_size = model_size(int8_path)
+report['fp32_size_bytes'] = fp32_size
+report['int8_size_bytes'] = int8_size
+print(f'Model size: {fp32_size/1e6:.1f} MB -> {int8_size/1e6:.1f} MB')
+
+with open(args.report, 'w', encoding='utf-8') as f:
+    json.dump(report, f, indent=2)
+print(f'Report saved to {args.report}')
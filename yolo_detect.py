@@ -1,12 +1,30 @@
 import os
 import sys
 import argparse
-import glob
 import time
 
+# Startup phases are measured from here, before the imports
+t_process_start = time.perf_counter()
+
 import cv2
 import numpy as np
-from ultralytics import YOLO
+
+from detector.sources import CACHE_HIT, FrameSource, get_source_type
+from detector.pipeline import StagedPipeline
+from detector.output import DetectionWriter
+from detector.postprocess import Detections, label_array
+from detector.backends import BACKENDS, load_backend, warm_up
+from detector.motion import MotionGate
+from detector.multistream import CameraStream, collect_ready
+from detector.tiling import TILE_REGIONS, TiledDetector
+from detector.metrics import MetricsExporter, StageMetrics
+from detector.cache import CACHE_KEY_MODES, DetectionCache
+from detector.tracking import AlertEngine, ByteTracker, EventWriter
+from detector.recorder import ClipRecorder
+from detector.roi import load_roi_config, region_mask
+from detector.adaptive import AdaptiveController
+from detector.shm import ProcessDetector
+t_imported = time.perf_counter()
 
 # Define and parse user input arguments
 
@@ -14,235 +32,773 @@ parser = argparse.ArgumentParser()
 parser.add_argument('--model', help='Path to YOLO model file (example: "runs/detect/train/weights/best.pt")',
                     required=True)
 parser.add_argument('--source', help='Image source, can be image file ("test.jpg"), \
-                    image folder ("test_dir"), video file ("testvid.mp4"), index of USB camera ("usb0"), or index of Picamera ("picamera0")', 
-                    required=True)
+                    image folder ("test_dir"), video file ("testvid.mp4"), index of USB camera ("usb0"), index of Picamera ("picamera0") \
+                    or stream URL ("rtsp://..."). Several video/camera/stream sources can be given to run them all on one loaded model.',
+                    nargs='+', required=True)
 parser.add_argument('--thresh', help='Minimum confidence threshold for displaying detected objects (example: "0.4")',
-                    default=0.5)
+                    type=float, default=0.5)
 parser.add_argument('--resolution', help='Resolution in WxH to display inference results at (example: "640x480"), \
                     otherwise, match source resolution',
                     default=None)
-parser.add_argument('--record', help='Record results from video or webcam and save it as "demo1.avi". Must specify --resolution argument to record.',
+parser.add_argument('--record', help='Record clips of video and camera sources around detections to --clip-dir, with --pre-event seconds before \
+                    the first detection and --post-event seconds after the last one. With --track, clips are triggered by alerts instead of single detections.',
+                    action='store_true')
+parser.add_argument('--clip-dir', help='Folder to save recorded clips in (example: "clips")',
+                    default='clips')
+parser.add_argument('--pre-event', help='Seconds of video kept in memory and saved before an event (example: "5")',
+                    type=float, default=5.0)
+parser.add_argument('--post-event', help='Seconds of video saved after the last frame of an event (example: "10")',
+                    type=float, default=10.0)
+parser.add_argument('--clip-buffer-mb', help='Maximum memory in MB used by the pre-event buffer of compressed frames (example: "64")',
+                    type=int, default=64)
+parser.add_argument('--clip-quality', help='JPEG quality of the frames held in memory for clips (example: "80")',
+                    type=int, default=80)
+parser.add_argument('--pipeline', help='Run capture, inference and display/recording on separate threads connected by bounded queues. \
+                    Live cameras drop the oldest queued frame when inference falls behind; video files keep every frame.',
+                    action='store_true')
+parser.add_argument('--batch', help='Run non-interactively on an image, image folder or video file, passing N frames through the model at once \
+                    and printing the detections of each frame in order (example: "8")',
+                    type=int, default=0)
+parser.add_argument('--headless', help='Do not draw or display results. Detections are written as JSON Lines or CSV to --output instead.',
+                    action='store_true')
+parser.add_argument('--output', help='File to write detections to in headless mode, or "-" for stdout (default)',
+                    default='-')
+parser.add_argument('--output-format', help='Format of the headless detection stream: "jsonl" (default) or "csv"',
+                    choices=['jsonl','csv'], default='jsonl')
+parser.add_argument('--backend', help='Inference backend: "pytorch" (default), "onnx" (onnxruntime CPU) or "openvino". \
+                    .pt weights are exported to the chosen format next to the weights file on first use.',
+                    choices=BACKENDS, default='pytorch')
+parser.add_argument('--imgsz', help='Inference input size in pixels, matching the training imgsz by default (example: "480")',
+                    type=int, default=480)
+parser.add_argument('--dynamic', help='Export the ONNX/OpenVINO model with dynamic input shapes, so frames are padded only to the next multiple of 32 instead of a full imgsz square',
+                    action='store_true')
+parser.add_argument('--threads', help='Number of intra-op CPU threads for the onnx and openvino backends (default: runtime decides)',
+                    type=int, default=0)
+parser.add_argument('--warmup', help='Number of inferences on blank frames to run before the first real frame, 0 to skip warm-up (example: "2")',
+                    type=int, default=1)
+parser.add_argument('--motion-gate', help='Only run the detector on video and camera frames that changed since the last inference, \
+                    reusing the last detections for static frames',
+                    action='store_true')
+parser.add_argument('--motion-thresh', help='Fraction of pixels that must change to run the detector with --motion-gate (example: "0.005")',
+                    type=float, default=0.005)
+parser.add_argument('--max-skip', help='Maximum number of frames in a row the motion gate may skip (example: "30")',
+                    type=int, default=30)
+parser.add_argument('--tile', help='Also run the detector on overlapping tiles of each frame at native resolution, to find small distant smoke',
+                    action='store_true')
+parser.add_argument('--tile-size', help='Tile size in pixels for --tile (example: "480")',
+                    type=int, default=480)
+parser.add_argument('--tile-overlap', help='Overlap between neighbouring tiles as a fraction of the tile size (example: "0.2")',
+                    type=float, default=0.2)
+parser.add_argument('--tile-region', help='Which tiles to run: "all" of the frame, only the "horizon" band, or only tiles around objects "flagged" by a full-frame pass',
+                    choices=TILE_REGIONS, default='all')
+parser.add_argument('--horizon', help='Horizon band for --tile-region horizon, as top:bottom fractions of the frame height (example: "0.3:0.6")',
+                    default='0.3:0.6')
+parser.add_argument('--flag-thresh', help='Confidence threshold of the full-frame pass that flags tiles for --tile-region flagged (example: "0.1")',
+                    type=float, default=0.1)
+parser.add_argument('--metrics-file', help='File to periodically write per-stage latency metrics to in Prometheus text format (example: "metrics.prom")',
+                    default=None)
+parser.add_argument('--metrics-port', help='Serve per-stage latency metrics in Prometheus text format at http://127.0.0.1:PORT/metrics (example: "9100")',
+                    type=int, default=None)
+parser.add_argument('--metrics-interval', help='Seconds between writes of --metrics-file (example: "10")',
+                    type=float, default=10.0)
+parser.add_argument('--recursive', help='Also process images in subfolders of an image folder source',
+                    action='store_true')
+parser.add_argument('--prefetch', help='Number of images of a folder source to decode ahead of inference (example: "8")',
+                    type=int, default=8)
+parser.add_argument('--loader-workers', help='Number of threads decoding images of a folder source (example: "4")',
+                    type=int, default=4)
+parser.add_argument('--loader-processes', help='Decode images of a folder source in worker processes instead of threads',
+                    action='store_true')
+parser.add_argument('--cache', help='SQLite file caching the detections of image and folder sources, so re-scans only infer new or changed images. \
+                    Only used with --headless or --batch (example: "detections.db")',
+                    default=None)
+parser.add_argument('--cache-key', help='Identify cached images by path, modification time and size ("stat", default) or by a hash of their contents ("content")',
+                    choices=CACHE_KEY_MODES, default='stat')
+parser.add_argument('--roi', help='JSON file with region-of-interest polygons per source. Only the bounding crop of a source\'s regions is run through the model, \
+                    at native resolution, and boxes outside the regions are dropped (example: "roi.json")',
+                    default=None)
+parser.add_argument('--roi-overlap', help='Minimum fraction of a box that must lie inside the regions of interest to keep it (example: "0.25")',
+                    type=float, default=0.25)
+parser.add_argument('--track', help='Track fire/smoke boxes across frames of video and camera sources and emit debounced alert events (start/update/end) as JSON Lines to --events',
                     action='store_true')
+parser.add_argument('--events', help='File to append alert events to with --track, or "-" for stdout (default)',
+                    default='-')
+parser.add_argument('--track-low', help='Confidence down to which detections may keep an existing track alive with --track, below --thresh (example: "0.1")',
+                    type=float, default=0.1)
+parser.add_argument('--alert-hits', help='Number of frames out of --alert-window a track must be seen in to raise an alert (example: "3")',
+                    type=int, default=3)
+parser.add_argument('--alert-window', help='Number of recent inferred frames considered for --alert-hits (example: "5")',
+                    type=int, default=5)
+parser.add_argument('--alert-update', help='Number of inferred frames between update events of an active alert (example: "30")',
+                    type=int, default=30)
+parser.add_argument('--track-max-misses', help='Number of inferred frames without a match after which a track is dropped and its alert ends (example: "15")',
+                    type=int, default=15)
+parser.add_argument('--track-stride', help='While every track is a confirmed alert, only run the detector on every Nth frame and let the tracks coast in between (example: "3")',
+                    type=int, default=1)
+parser.add_argument('--target-fps', help='Frame rate to sustain on video and camera sources. Inference imgsz is stepped down, and then frames are skipped, \
+                    when inference falls behind, and restored when there is headroom (example: "5")',
+                    type=float, default=None)
+parser.add_argument('--target-latency', help='Maximum inference time per frame in milliseconds, enforced by stepping imgsz down and up (example: "150")',
+                    type=float, default=None)
+parser.add_argument('--adaptive-sizes', help='Comma-separated inference sizes the controller may switch between (default: 640, 480, 416 and 320, up to --imgsz)',
+                    default=None)
+parser.add_argument('--workers', help='Run capture and inference in separate processes: one capture process per video/camera source writing \
+                    into a shared-memory frame ring, and N inference processes each with their own copy of the model (example: "3")',
+                    type=int, default=0)
+parser.add_argument('--shm-slots', help='Number of frame buffers in the shared-memory ring of each source with --workers (example: "4")',
+                    type=int, default=4)
+parser.add_argument('--adaptive-max-skip', help='Maximum number of frames skipped between inferences to meet --target-fps (example: "5")',
+                    type=int, default=5)
 
 args = parser.parse_args()
 
 
 # Parse user inputs
 model_path = args.model
-img_source = args.source
+img_sources = args.source
+img_source = img_sources[0]
+multi_source = len(img_sources) > 1
 min_thresh = args.thresh
 user_res = args.resolution
 record = args.record
+use_pipeline = args.pipeline
+batch_size = args.batch
+headless = args.headless
 
 # Check if model file exists and is valid
 if (not os.path.exists(model_path)):
     print('ERROR: Model path is invalid or model was not found. Make sure the model filename was entered correctly.')
     sys.exit(0)
 
-# Load the model into memory and get labemap
-model = YOLO(model_path, task='detect')
-labels = model.names
+# Set up per-stage timing (ring buffers over the last fps_avg_len samples)
+fps_avg_len = 200
+metrics = StageMetrics(fps_avg_len)
+metrics.mark('imports', t_imported - t_process_start)
 
 # Parse input to determine if image source is a file, folder, video, or USB camera
-img_ext_list = ['.jpg','.JPG','.jpeg','.JPEG','.png','.PNG','.bmp','.BMP']
-vid_ext_list = ['.avi','.mov','.mp4','.mkv','.wmv']
-
-if os.path.isdir(img_source):
-    source_type = 'folder'
-elif os.path.isfile(img_source):
-    _, ext = os.path.splitext(img_source)
-    if ext in img_ext_list:
-        source_type = 'image'
-    elif ext in vid_ext_list:
-        source_type = 'video'
-    else:
-        print(f'File extension {ext} is not supported.')
-        sys.exit(0)
-elif 'usb' in img_source:
-    source_type = 'usb'
-    usb_idx = int(img_source[3:])
-elif 'picamera' in img_source:
-    source_type = 'picamera'
-    picam_idx = int(img_source[8:])
-else:
-    print(f'Input {img_source} is invalid. Please try again.')
+try:
+    source_types = [get_source_type(src) for src in img_sources]
+except ValueError as e:
+    print(e)
     sys.exit(0)
+source_type = source_types[0]
+
+# Check if multi-source mode is valid
+if multi_source:
+    if any(src_type in ['image','folder'] for src_type in source_types):
+        print('Multiple sources only work for video, camera and stream sources. Please try again.')
+        sys.exit(0)
+    if record or use_pipeline or batch_size:
+        print('Multiple sources cannot be combined with --record, --pipeline or --batch. Please try again.')
+        sys.exit(0)
 
 # Parse user-specified display resolution
 resize = False
+resW, resH = None, None
 if user_res:
     resize = True
     resW, resH = int(user_res.split('x')[0]), int(user_res.split('x')[1])
 
-# Check if recording is valid and set up recording
+# Check if recording is valid
 if record:
-    if source_type not in ['video','usb']:
+    if source_type not in ['video','usb','picamera','stream']:
         print('Recording only works for video and camera sources. Please try again.')
         sys.exit(0)
-    if not user_res:
-        print('Please specify resolution to record video at.')
-        sys.exit(0)
-    
-    # Set up recording
-    record_name = 'demo1.avi'
-    record_fps = 30
-    recorder = cv2.VideoWriter(record_name, cv2.VideoWriter_fourcc(*'MJPG'), record_fps, (resW,resH))
-
-# Load or initialize image source
-if source_type == 'image':
-    imgs_list = [img_source]
-elif source_type == 'folder':
-    imgs_list = []
-    filelist = glob.glob(img_source + '/*')
-    for file in filelist:
-        _, file_ext = os.path.splitext(file)
-        if file_ext in img_ext_list:
-            imgs_list.append(file)
-elif source_type == 'video' or source_type == 'usb':
-
-    if source_type == 'video': cap_arg = img_source
-    elif source_type == 'usb': cap_arg = usb_idx
-    cap = cv2.VideoCapture(cap_arg)
-
-    # Set camera or video resolution if specified by user
-    if user_res:
-        ret = cap.set(3, resW)
-        ret = cap.set(4, resH)
-
-elif source_type == 'picamera':
-    from picamera2 import Picamera2
-    cap = Picamera2()
-    cap.configure(cap.create_video_configuration(main={"format": 'RGB888', "size": (resW, resH)}))
-    cap.start()
 
-# Set bounding box colors (using the Tableu 10 color scheme)
-bbox_colors = [(164,120,87), (68,148,228), (93,97,209), (178,182,133), (88,159,106), 
-              (96,202,231), (159,124,168), (169,162,241), (98,118,150), (172,176,184)]
+# Check if pipeline mode is valid
+if use_pipeline and source_type not in ['video','usb','picamera','stream']:
+    print('Pipeline mode only works for video and camera sources. Please try again.')
+    sys.exit(0)
 
-# Initialize control and status variables
-avg_frame_rate = 0
-frame_rate_buffer = []
-fps_avg_len = 200
-img_count = 0
+# Check if batch mode is valid
+if batch_size:
+    if source_type not in ['image','folder','video']:
+        print('Batch mode only works for image, image folder and video file sources. Please try again.')
+        sys.exit(0)
+    if use_pipeline or record:
+        print('Batch mode cannot be combined with --pipeline or --record. Please try again.')
+        sys.exit(0)
 
-# Begin inference loop
-while True:
+# Check if tracking is valid and set up the alert event stream
+if args.track:
+    if source_type not in ['video','usb','picamera','stream'] or batch_size:
+        print('Tracking only works for video and camera sources without --batch. Please try again.')
+        sys.exit(0)
+    if headless and args.output == '-' and args.events == '-':
+        print('Detections and alert events cannot both be written to stdout, please give a file for --output or --events.')
+        sys.exit(0)
+    if args.alert_hits > args.alert_window:
+        print('--alert-hits cannot be larger than --alert-window. Please try again.')
+        sys.exit(0)
+    events_writer = EventWriter(args.events, sys.stdout)
+
+# Detections between --track-low and --thresh are only kept to extend existing tracks
+detect_thresh = min(args.track_low, min_thresh) if args.track else min_thresh
+
+# Set up the structured detection stream for headless mode
+if headless:
+    writer = DetectionWriter(args.output, args.output_format)
+if (headless and args.output == '-') or (args.track and args.events == '-'):
+    # Keep stdout clean for the detection or event stream, status messages go to stderr
+    sys.stdout = sys.stderr
+
+# Check if motion gating is valid and set up the gate
+motion_gate = None
+if args.motion_gate:
+    if source_type not in ['video','usb','picamera','stream'] or batch_size:
+        print('Motion gating only works for video and camera sources without --batch. Please try again.')
+        sys.exit(0)
+    motion_gate = MotionGate(args.motion_thresh, args.max_skip)
 
-    t_start = time.perf_counter()
+# Check if the detection cache is valid and open it
+cache = None
+if args.cache:
+    if source_type not in ['image','folder'] or not (headless or batch_size):
+        print('The detection cache only works for image and folder sources with --headless or --batch. Please try again.')
+        sys.exit(0)
+    cache_settings = f'backend={args.backend};imgsz={args.imgsz};dynamic={args.dynamic};thresh={min_thresh};resolution={user_res}'
+    if args.tile:
+        cache_settings += f';tile={args.tile_size},{args.tile_overlap},{args.tile_region},{args.horizon},{args.flag_thresh}'
+    if args.roi:
+        cache_settings += f';roi={os.path.abspath(args.roi)}@{os.path.getmtime(args.roi)},{args.roi_overlap}'
+    cache = DetectionCache(args.cache, model_path, cache_settings, args.cache_key)
+
+# Load the regions of interest. Frames are then cropped at native resolution and only resized for display after inference.
+roi_config = None
+if args.roi:
+    try:
+        roi_config = load_roi_config(args.roi)
+    except (OSError, ValueError) as e:
+        print(f'Unable to read ROI config {args.roi}: {e}')
+        sys.exit(0)
+resize_before_detect = resize and roi_config is None
+resize_to = (resW, resH) if resize_before_detect else None
 
-    # Load frame from image source
-    if source_type == 'image' or source_type == 'folder': # If source is image or image folder, load the image using its filename
-        if img_count >= len(imgs_list):
-            print('All images have been processed. Exiting program.')
-            sys.exit(0)
-        img_filename = imgs_list[img_count]
-        frame = cv2.imread(img_filename)
-        img_count = img_count + 1
-    
-    elif source_type == 'video': # If source is a video, load next frame from video file
-        ret, frame = cap.read()
-        if not ret:
-            print('Reached end of the video file. Exiting program.')
-            break
-    
-    elif source_type == 'usb': # If source is a USB camera, grab frame from camera
-        ret, frame = cap.read()
-        if (frame is None) or (not ret):
-            print('Unable to read frames from the camera. This indicates the camera is disconnected or not working. Exiting program.')
-            break
+# Check if adaptive control is valid
+if args.target_fps or args.target_latency:
+    if source_type not in ['video','usb','picamera','stream'] or batch_size:
+        print('Adaptive control only works for video and camera sources without --batch. Please try again.')
+        sys.exit(0)
+    if args.adaptive_sizes:
+        adaptive_sizes = [int(v) for v in args.adaptive_sizes.split(',')]
+    else:
+        adaptive_sizes = [s for s in (640, 480, 416, 320) if s <= args.imgsz] + [args.imgsz]
+
+# All arguments are checked at this point, so a mistake is reported before the slow model load.
+# Check if worker process mode is valid and start the capture and inference processes.
+# They are forked before this process loads a model, and each worker loads its own copy.
+process_detector = None
+if args.workers:
+    if any(src_type not in ['video','usb','picamera','stream'] for src_type in source_types):
+        print('Worker processes only work for video, camera and stream sources. Please try again.')
+        sys.exit(0)
+    if (use_pipeline or batch_size or record or args.track or args.tile or args.roi or args.motion_gate or args.cache
+            or args.target_fps or args.target_latency):
+        print('Worker processes cannot be combined with --pipeline, --batch, --record, --track, --tile, --roi, --motion-gate, --cache or adaptive control. Please try again.')
+        sys.exit(0)
+    process_detector = ProcessDetector(img_sources, source_types, (model_path, args.backend, args.imgsz, args.dynamic, args.threads),
+                                       min_thresh, args.workers, args.shm_slots, (resW, resH) if user_res else None,
+                                       (resW, resH) if resize else None)
+    t_load = time.perf_counter()
+    try:
+        labels = process_detector.start()
+    except RuntimeError as e:
+        print(e)
+        sys.exit(0)
+    # Workers load and warm up their model before reporting ready
+    metrics.mark('model_load', time.perf_counter() - t_load)
+    label_names = label_array(labels)
+else:
+    # Load the model into memory and get labemap
+    t_load = time.perf_counter()
+    model = load_backend(model_path, args.backend, args.imgsz, args.dynamic, args.threads)
+    metrics.mark('model_load', time.perf_counter() - t_load)
+    model.metrics = metrics
+    labels = model.names
+    label_names = label_array(labels)
+
+# Set up tiled inference
+tiler = None
+if args.tile:
+    horizon = tuple(float(v) for v in args.horizon.split(':'))
+    tiler = TiledDetector(model, args.tile_size, args.tile_overlap, args.tile_region, horizon, args.flag_thresh)
+
+# Warm up the model on blank frames of the size it will be fed, so the first real frame is not slowed down
+if process_detector is None and args.warmup:
+    if tiler is not None:
+        warmup_shape = (args.tile_size, args.tile_size)
+    elif resize_before_detect or user_res:
+        warmup_shape = (resH, resW)
+    else:
+        warmup_shape = (args.imgsz, args.imgsz)
+    warmup_batch = batch_size or (len(img_sources) if multi_source else 1)
+    metrics.mark('warmup', warm_up(model, warmup_shape, warmup_batch, args.warmup))
+
+# Set up the adaptive controller
+controller = None
+if args.target_fps or args.target_latency:
+    if getattr(model, 'fixed_shape', None) is not None:
+        # A fixed-shape export only accepts its own input size, so only the frame skip can adapt
+        print('The exported model has a fixed input size, only the frame skip will adapt. Use --dynamic to also adapt imgsz.')
+        adaptive_sizes = [args.imgsz]
+    controller = AdaptiveController(model, adaptive_sizes, args.target_fps,
+                                    args.target_latency / 1000 if args.target_latency else None,
+                                    max_skip=args.adaptive_max_skip)
+
+
+def make_tracker(name):
+    """Create the tracker and alert engine of one source."""
+    tracker = ByteTracker(min_thresh, min_hits=args.alert_hits, window=args.alert_window,
+                          max_misses=args.track_max_misses, infer_stride=args.track_stride)
+    return tracker, AlertEngine(label_names, name, args.alert_update)
+
+
+# Load or initialize image source(s)
+tracker, alerts, roi = None, None, None
+if process_detector is not None:
+    pass # Sources are read by the capture processes
+elif multi_source:
+    streams = []
+    trackers = {src: make_tracker(src) for src in img_sources} if args.track else {}
+    stream_rois = {src: region_mask(roi_config, src, args.roi_overlap) for src in img_sources} if roi_config else {}
+    for src, src_type in zip(img_sources, source_types):
+        stream_gate = MotionGate(args.motion_thresh, args.max_skip) if args.motion_gate else None
+        stream_source = FrameSource(src, src_type, (resW, resH) if user_res else None, metrics)
+        streams.append(CameraStream(src, stream_source, resize_to, stream_gate, metrics=metrics))
+else:
+    source = FrameSource(img_source, source_type, (resW, resH) if user_res else None, metrics,
+                         args.recursive, args.prefetch, args.loader_workers, resize_to, args.loader_processes, cache)
+    if roi_config:
+        roi = region_mask(roi_config, img_source, args.roi_overlap)
+    if args.track:
+        tracker, alerts = make_tracker(img_source)
+    if record:
+        # Set up event clip recording. Clips of video files play back at the video's own frame rate
+        recorder = ClipRecorder(args.clip_dir, args.pre_event, args.post_event, args.clip_buffer_mb << 20,
+                                jpeg_quality=args.clip_quality, fps=source.video_fps)
+
+# Start publishing metrics
+exporter = None
+if args.metrics_file or args.metrics_port:
+    exporter = MetricsExporter(metrics, args.metrics_file, args.metrics_port, args.metrics_interval)
+    exporter.start()
 
-    elif source_type == 'picamera': # If source is a Picamera, grab frames using picamera interface
-        frame = cap.capture_array()
-        if (frame is None):
-            print('Unable to read frames from the Picamera. This indicates the camera is disconnected or not working. Exiting program.')
-            break
+# Set bounding box colors (using the Tableu 10 color scheme)
+bbox_colors = [(164,120,87), (68,148,228), (93,97,209), (178,182,133), (88,159,106),
+              (96,202,231), (159,124,168), (169,162,241), (98,118,150), (172,176,184)]
 
-    # Resize frame to desired display resolution
-    if resize == True:
-        frame = cv2.resize(frame,(resW,resH))
 
-    # Run inference on frame
-    results = model(frame, verbose=False)
+def draw_detections(frame, detections):
+    """Draw boxes and labels for detections. Returns the number of objects drawn."""
+    t_start = time.perf_counter()
 
-    # Extract results
-    detections = results[0].boxes
+    # Class names and label text for all detections are looked up at once
+    classnames = detections.names(label_names)
+    boxes = detections.xyxy.astype(int)
+    percents = (detections.conf*100).astype(int)
 
-    # Initialize variable for basic object counting example
-    object_count = 0
+    # Go through each detection and draw its bbox and label
+    for (xmin, ymin, xmax, ymax), classidx, classname, percent in zip(boxes.tolist(), detections.cls.tolist(), classnames, percents.tolist()):
 
-    # Go through each detection and get bbox coords, confidence, and class
-    for i in range(len(detections)):
+        color = bbox_colors[classidx % 10]
+        cv2.rectangle(frame, (xmin,ymin), (xmax,ymax), color, 2)
 
-        # Get bounding box coordinates
-        # Ultralytics returns results in Tensor format, which have to be converted to a regular Python array
-        xyxy_tensor = detections[i].xyxy.cpu() # Detections in Tensor format in CPU memory
-        xyxy = xyxy_tensor.numpy().squeeze() # Convert tensors to Numpy array
-        xmin, ymin, xmax, ymax = xyxy.astype(int) # Extract individual coordinates and convert to int
+        label = f'{classname}: {percent}%'
+        labelSize, baseLine = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.5, 1) # Get font size
+        label_ymin = max(ymin, labelSize[1] + 10) # Make sure not to draw label too close to top of window
+        cv2.rectangle(frame, (xmin, label_ymin-labelSize[1]-10), (xmin+labelSize[0], label_ymin+baseLine-10), color, cv2.FILLED) # Draw white box to put label text in
+        cv2.putText(frame, label, (xmin, label_ymin-7), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 0), 1) # Draw label text
 
-        # Get bounding box class ID and name
-        classidx = int(detections[i].cls.item())
-        classname = labels[classidx]
+    metrics.record('draw', time.perf_counter() - t_start)
 
-        # Get bounding box confidence
-        conf = detections[i].conf.item()
+    # Basic example: count the number of objects in the image
+    return len(detections)
 
-        # Draw box if confidence threshold is high enough
-        if conf > 0.5:
 
-            color = bbox_colors[classidx % 10]
-            cv2.rectangle(frame, (xmin,ymin), (xmax,ymax), color, 2)
+def summarize_detections(detections):
+    """Count the detections per class name."""
+    class_counts = detections.class_counts(len(label_names))
+    return {label_names[i]: int(class_counts[i]) for i in np.flatnonzero(class_counts)}
 
-            label = f'{classname}: {int(conf*100)}%'
-            labelSize, baseLine = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.5, 1) # Get font size
-            label_ymin = max(ymin, labelSize[1] + 10) # Make sure not to draw label too close to top of window
-            cv2.rectangle(frame, (xmin, label_ymin-labelSize[1]-10), (xmin+labelSize[0], label_ymin+baseLine-10), color, cv2.FILLED) # Draw white box to put label text in
-            cv2.putText(frame, label, (xmin, label_ymin-7), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 0), 1) # Draw label text
 
-            # Basic example: count the number of objects in the image
-            object_count = object_count + 1
+def show_results(frame, object_count, avg_frame_rate):
+    """Draw the status overlay and display the frame. Returns the key pressed."""
+    t_start = time.perf_counter()
 
     # Calculate and draw framerate (if using video, USB, or Picamera source)
-    if source_type == 'video' or source_type == 'usb' or source_type == 'picamera':
+    if source_type == 'video' or source_type == 'usb' or source_type == 'picamera' or source_type == 'stream':
         cv2.putText(frame, f'FPS: {avg_frame_rate:0.2f}', (10,20), cv2.FONT_HERSHEY_SIMPLEX, .7, (0,255,255), 2) # Draw framerate
-    
+
     # Display detection results
     cv2.putText(frame, f'Number of objects: {object_count}', (10,40), cv2.FONT_HERSHEY_SIMPLEX, .7, (0,255,255), 2) # Draw total number of detected objects
+    if alerts is not None:
+        cv2.putText(frame, f'Active alerts: {len(alerts.active)}', (10,60), cv2.FONT_HERSHEY_SIMPLEX, .7, (0,0,255), 2) # Draw number of confirmed alerts
     cv2.imshow('YOLO detection results',frame) # Display image
-    if record: recorder.write(frame)
 
     # If inferencing on individual images, wait for user keypress before moving to next image. Otherwise, wait 5ms before moving to next frame.
     if source_type == 'image' or source_type == 'folder':
         key = cv2.waitKey()
-    elif source_type == 'video' or source_type == 'usb' or source_type == 'picamera':
+    elif use_pipeline:
+        key = cv2.waitKey(1)
+    else:
         key = cv2.waitKey(5)
-    
-    if key == ord('q') or key == ord('Q'): # Press 'q' to quit
-        break
-    elif key == ord('s') or key == ord('S'): # Press 's' to pause inference
+
+    if key == ord('s') or key == ord('S'): # Press 's' to pause inference
         cv2.waitKey()
     elif key == ord('p') or key == ord('P'): # Press 'p' to save a picture of results on this frame
         cv2.imwrite('capture.png',frame)
-    
-    # Calculate FPS for this frame
-    t_stop = time.perf_counter()
-    frame_rate_calc = float(1/(t_stop - t_start))
-
-    # Append FPS result to frame_rate_buffer (for finding average FPS over multiple frames)
-    if len(frame_rate_buffer) >= fps_avg_len:
-        temp = frame_rate_buffer.pop(0)
-        frame_rate_buffer.append(frame_rate_calc)
+
+    metrics.record('display', time.perf_counter() - t_start)
+    return key
+
+
+def note_first_detection():
+    """Record the time from process start to the first frame's detections, once."""
+    if 'first_detection' not in metrics.startup:
+        metrics.mark('first_detection', time.perf_counter() - t_process_start)
+        print(f'Time to first detection: {metrics.startup["first_detection"]:.2f} s')
+
+
+def infer(frames):
+    """Run the model on a list of frames and return their detections. Boxes below the confidence threshold are discarded before NMS."""
+    if tiler is not None:
+        detections = [tiler.predict(frame, detect_thresh) for frame in frames]
     else:
-        frame_rate_buffer.append(frame_rate_calc)
+        detections = model.predict(frames, detect_thresh)
+    note_first_detection()
+    return detections
+
+
+def predict(frames, rois=None):
+    """Run the model on a list of frames. With a region of interest per frame (or None), only the crop around it is inferred."""
+    if rois is None:
+        return infer(frames)
+    crops = [roi.crop(frame) if roi is not None else (frame, (0, 0)) for frame, roi in zip(frames, rois)]
+    to_run = [i for i, (crop, _) in enumerate(crops) if crop.size]
+    results = [Detections.empty() for _ in frames]
+    for i, detections in zip(to_run, infer([crops[i][0] for i in to_run])):
+        results[i] = rois[i].apply(detections, crops[i][1]) if rois[i] is not None else detections
+    return results
+
+
+def detect(frame):
+    """Run the model on a single frame, or reuse the last detections if the adaptive controller, the tracker or the motion gate says the frame can be skipped."""
+    global last_detections
+    if controller is not None and not controller.should_infer():
+        return last_detections
+    if tracker is not None and not tracker.should_infer():
+        return last_detections
+    if motion_gate is not None and not motion_gate.should_infer(frame):
+        return last_detections
+    t_start = time.perf_counter()
+    last_detections = predict([frame], [roi] if roi is not None else None)[0]
+    if controller is not None:
+        controller.update(time.perf_counter() - t_start)
+    return last_detections
+
+
+def read_frame():
+    """Load the next frame from the image source and resize it to the display resolution."""
+    frame = source.read()
+    if frame is None or frame is CACHE_HIT:
+        return frame
+    # Images of folder sources already come resized from the loader workers
+    if resize_before_detect and (frame.shape[1], frame.shape[0]) != (resW, resH):
+        with metrics.time('resize'):
+            frame = cv2.resize(frame,(resW,resH))
+    return frame
+
+
+def scale_to_display(frame, detections):
+    """Scale detections of a frame inferred at native resolution to the display resolution."""
+    if not resize or (frame.shape[1], frame.shape[0]) == (resW, resH):
+        return detections
+    return detections.scale(resW / frame.shape[1], resH / frame.shape[0])
+
+
+def to_display(frame, detections):
+    """Resize a frame inferred at native resolution to the display resolution, along with its detections."""
+    if not resize or (frame.shape[1], frame.shape[0]) == (resW, resH):
+        return frame, detections
+    detections = scale_to_display(frame, detections)
+    with metrics.time('resize'):
+        frame = cv2.resize(frame,(resW,resH))
+    return frame, detections
+
+
+def update_frame_rate(t_start, t_stop):
+    """Record the time taken by one frame and return the average FPS over recent frames."""
+    metrics.record('frame', t_stop - t_start)
+    return metrics.fps()
 
-    # Calculate average FPS for past frames
-    avg_frame_rate = np.mean(frame_rate_buffer)
+
+def write_detections(frame_index, origin, detections):
+    with metrics.time('write'):
+        writer.write(frame_index, time.time(), origin, detections.rows(label_names))
+
+
+def record_frame(frame, frame_index, t_capture, detections):
+    """Add a frame to the clip recorder. Frames with detections, or with an active alert when tracking, trigger a clip."""
+    triggered = len(alerts.active) > 0 if alerts is not None else len(detections) > 0
+    with metrics.time('record'):
+        # Frames of a video file are timed by their position in the video, which may be read faster than real time
+        recorder.add(frame, frame_index / source.video_fps if source.video_fps else t_capture, triggered)
+
+
+def track(source_tracker, source_alerts, frame_index, detections):
+    """Update a source's tracks with one frame, write its alert events and return the detections above --thresh."""
+    with metrics.time('track'):
+        tracks, removed = source_tracker.update(detections, frame_index)
+        events = source_alerts.step(tracks, removed, frame_index)
+    events_writer.write(events)
+    return detections.filter(detections.conf >= min_thresh)
+
+
+# Initialize control and status variables
+last_detections = Detections.empty()
+avg_frame_rate = 0
+
+if process_detector is not None:
+
+    # Workers finish frames of all sources in any order, frames are read in place from shared memory
+    t_last = time.perf_counter()
+    latency_total = 0.0
+    frames_processed = 0
+    try:
+        for source_index, frame_index, t_capture, frame, detections, t_infer in process_detector.results():
+            stream_name = img_sources[source_index]
+            metrics.record('inference', t_infer)
+            note_first_detection()
+            if headless:
+                write_detections(frame_index, stream_name, detections)
+            else:
+                # Drawing happens in the shared buffer itself, the slot is handed back on the next iteration
+                object_count = draw_detections(frame, detections)
+                cv2.putText(frame, f'FPS: {avg_frame_rate:0.2f}', (10,20), cv2.FONT_HERSHEY_SIMPLEX, .7, (0,255,255), 2) # Draw framerate
+                cv2.putText(frame, f'Number of objects: {object_count}', (10,40), cv2.FONT_HERSHEY_SIMPLEX, .7, (0,255,255), 2) # Draw total number of detected objects
+                cv2.imshow(f'YOLO detection results - {stream_name}', frame) # One window per source
+                key = cv2.waitKey(1)
+                if key == ord('q') or key == ord('Q'): # Press 'q' to quit
+                    break
+
+            t_now = time.perf_counter()
+            avg_frame_rate = update_frame_rate(t_last, t_now)
+            t_last = t_now
+            latency_total = latency_total + (t_now - t_capture)
+            frames_processed = frames_processed + 1
+    finally:
+        frame = None
+        process_detector.stop()
+    for stream_name, dropped in zip(img_sources, process_detector.dropped):
+        print(f'{stream_name}: dropped {dropped} frames')
+    if frames_processed:
+        print(f'Average capture-to-display latency: {latency_total/frames_processed*1000:.1f} ms')
+
+elif multi_source:
+
+    # Grab the next frame of every stream that has one and run them through the model as one batch
+    for stream in streams:
+        stream.start()
+
+    while not all(stream.finished for stream in streams):
+        ready = collect_ready(streams)
+        if not ready:
+            time.sleep(0.002)
+            continue
+        t_start = time.perf_counter()
+
+        # Frames the stream's motion gate considers static keep that stream's last detections
+        to_infer = [(stream, frame) for stream, (_, _, frame) in ready
+                    if (stream.name not in trackers or trackers[stream.name][0].should_infer())
+                    and (stream.gate is None or stream.gate.should_infer(frame))]
+        # The adaptive controller skips whole rounds, since all streams share the model's time budget
+        if to_infer and (controller is None or controller.should_infer()):
+            rois = [stream_rois.get(stream.name) for stream, _ in to_infer] if stream_rois else None
+            t_infer = time.perf_counter()
+            for (stream, _), detections in zip(to_infer, predict([frame for _, frame in to_infer], rois)):
+                stream.last_detections = detections
+            if controller is not None:
+                controller.update((time.perf_counter() - t_infer) / len(to_infer))
+
+        for stream, (frame_index, t_capture, frame) in ready:
+            stream.mark_processed()
+            detections = stream.last_detections
+            if stream.name in trackers:
+                detections = track(*trackers[stream.name], frame_index, detections)
+            if headless:
+                write_detections(frame_index, stream.name, scale_to_display(frame, detections))
+            else:
+                frame, detections = to_display(frame, detections)
+                object_count = draw_detections(frame, detections)
+                cv2.putText(frame, f'FPS: {stream.fps:0.2f}', (10,20), cv2.FONT_HERSHEY_SIMPLEX, .7, (0,255,255), 2) # Draw framerate
+                cv2.putText(frame, f'Number of objects: {object_count}', (10,40), cv2.FONT_HERSHEY_SIMPLEX, .7, (0,255,255), 2) # Draw total number of detected objects
+                cv2.imshow(f'YOLO detection results - {stream.name}', frame) # One window per stream
+
+        if not headless:
+            key = cv2.waitKey(1)
+            if key == ord('q') or key == ord('Q'): # Press 'q' to quit
+                break
+
+        # Time per frame is the loop time shared by the frames processed together
+        t_stop = time.perf_counter()
+        for _ in ready:
+            metrics.record('frame', (t_stop - t_start) / len(ready))
+
+    for stream in streams:
+        stream.stop()
+        if stream.name in trackers:
+            events_writer.write(trackers[stream.name][1].finish(stream.frames_processed))
+        print(f'{stream.name}: {stream.frames_processed} frames, {stream.fps:.2f} FPS, dropped {stream.queue.dropped}')
+    avg_frame_rate = sum(stream.fps for stream in streams)
+
+elif use_pipeline:
+
+    # In pipeline mode the FPS is the rate at which frames leave the render stage
+    t_last_render = time.perf_counter()
+
+    def render(frame_index, t_capture, frame, detections):
+        global avg_frame_rate, t_last_render
+        if tracker is not None:
+            detections = track(tracker, alerts, frame_index, detections)
+        if headless:
+            write_detections(frame_index, img_source, scale_to_display(frame, detections))
+            key = -1
+        else:
+            frame, detections = to_display(frame, detections)
+            object_count = draw_detections(frame, detections)
+            key = show_results(frame, object_count, avg_frame_rate)
+        if record:
+            record_frame(frame, frame_index, t_capture, detections)
+
+        t_now = time.perf_counter()
+        avg_frame_rate = update_frame_rate(t_last_render, t_now)
+        t_last_render = t_now
+
+        return not (key == ord('q') or key == ord('Q')) # Press 'q' to quit
+
+    pipeline = StagedPipeline(read_frame, detect, render, live=source.live)
+    pipeline.run()
+    print(f'Frames dropped to keep up with the camera: {pipeline.frames_dropped}')
+    print(f'Average capture-to-display latency: {pipeline.avg_latency*1000:.1f} ms')
+
+elif batch_size:
+
+    # Collect batch_size frames, run them through the model together and report each frame in order.
+    # Cached images don't take a batch slot, but at most 4*batch_size images are held back for reporting.
+    frames_processed = 0
+    t_first = time.perf_counter()
+    source_done = False
+    while not source_done:
+        t_start = time.perf_counter()
+        frames = []
+        items = []
+        while len(frames) < batch_size and len(items) < 4*batch_size:
+            frame = read_frame()
+            if frame is None:
+                source_done = True
+                break
+            if frame is CACHE_HIT:
+                items.append((source.frame_name(), source.origin(), source.cached))
+            else:
+                items.append((source.frame_name(), source.origin(), len(frames)))
+                frames.append(frame)
+        if not items:
+            break
+
+        frame_detections = predict(frames, [roi]*len(frames) if roi is not None else None) if frames else []
+
+        for i, (frame_name, frame_origin, result) in enumerate(items):
+            if isinstance(result, int):
+                detections = scale_to_display(frames[result], frame_detections[result])
+                if cache is not None:
+                    cache.store(frame_origin, detections)
+            else:
+                detections = result
+            if headless:
+                write_detections(frames_processed + i + 1, frame_origin, detections)
+                continue
+            class_counts = summarize_detections(detections)
+            object_count = sum(class_counts.values())
+            counts_str = ', '.join(f'{name}: {count}' for name, count in class_counts.items())
+            print(f'{frame_name}: {object_count} objects' + (f' ({counts_str})' if counts_str else ''))
+        frames_processed = frames_processed + len(items)
+
+        t_stop = time.perf_counter()
+        for _ in items:
+            metrics.record('frame', (t_stop - t_start) / len(items))
+
+    if frames_processed:
+        avg_frame_rate = frames_processed / (time.perf_counter() - t_first)
+
+else:
+
+    # Begin inference loop
+    while True:
+
+        t_start = time.perf_counter()
+
+        # Load frame from image source
+        frame = read_frame()
+        if frame is None:
+            break
+
+        # Run inference on frame, unless its detections are cached
+        if frame is CACHE_HIT:
+            detections = source.cached
+        else:
+            detections = detect(frame)
+            if tracker is not None:
+                detections = track(tracker, alerts, source.frame_count, detections)
+            # With regions of interest, detections are in native frame coordinates until the frame is resized for display
+            if headless:
+                detections = scale_to_display(frame, detections)
+            else:
+                frame, detections = to_display(frame, detections)
+            if cache is not None:
+                cache.store(source.origin(), detections)
+
+        # Write detections in headless mode, otherwise draw detections and display results
+        if headless:
+            write_detections(source.frame_count, source.origin(), detections)
+            key = -1
+        else:
+            object_count = draw_detections(frame, detections)
+            key = show_results(frame, object_count, avg_frame_rate)
+        if record:
+            record_frame(frame, source.frame_count, t_start, detections)
+
+        if key == ord('q') or key == ord('Q'): # Press 'q' to quit
+            break
+
+        # Calculate FPS for this frame
+        t_stop = time.perf_counter()
+        avg_frame_rate = update_frame_rate(t_start, t_stop)
 
 
 # Clean up
 print(f'Average pipeline FPS: {avg_frame_rate:.2f}')
-if source_type == 'video' or source_type == 'usb':
-    cap.release()
-elif source_type == 'picamera':
-    cap.stop()
-if record: recorder.release()
-cv2.destroyAllWindows()
+metrics.print_summary()
+if exporter is not None:
+    exporter.stop()
+if motion_gate is not None:
+    print(f'Frames skipped by the motion gate: {motion_gate.frames_skipped} ({motion_gate.skip_ratio*100:.1f}%)')
+if tracker is not None:
+    events_writer.write(alerts.finish(source.frame_count))
+    print(f'Frames skipped between confirmed alerts: {tracker.frames_skipped}')
+if args.track:
+    events_writer.close()
+if controller is not None:
+    print(f'Adaptive control: {len(controller.decisions)} changes, final imgsz {controller.imgsz}, skip {controller.skip}, '
+          f'{controller.frames_skipped} frames skipped')
+if not multi_source and process_detector is None:
+    source.release()
+if record:
+    recorder.close()
+    print(f'Clips saved: {recorder.clips_saved}')
+if cache is not None:
+    print(f'Detection cache: {cache.hits} hits, {cache.misses} misses')
+    cache.close()
+if headless:
+    writer.close()
+elif not batch_size:
+    cv2.destroyAllWindows() # Batch mode only prints results and never opens a window